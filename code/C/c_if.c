@@ -62,9 +62,11 @@ void setup_logic(u_int8_t *salt, u_int8_t *hash) {
 }
 
 void poll_sreg(u_int8_t sreg_bit) {
-    while (1) {
-        if (test_sreg(sreg_bit))
-            break;
+    useconds_t delay = POLL_MIN_US;
+
+    while (!test_sreg(sreg_bit)) {
+        usleep(delay);
+        delay = delay * 2 < POLL_MAX_US ? delay * 2 : POLL_MAX_US;
     }
 }
 
@@ -16,6 +16,9 @@
 #define SREG_DONE  0x10
 #define SREG_SUCC  0x20
 
+#define POLL_MIN_US    100
+#define POLL_MAX_US 100000
+
 #define BCRYPT_VERSION '2'
 #define BCRYPT_MAXSALT 16
 #define BCRYPT_MAXHASH 24
@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+# coding: utf-8
+from helper import *
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+KEY_LEN = 72
+KEY_WORDS = KEY_LEN // 4
+BATCH_SIZE = 1024
+
+
+class KeyBatch(object):
+    # `count` keys of keyspace indices start..start+count-1, NUL terminated
+    # and cycled to 72 bytes, back to back in one bytearray
+
+    def __init__(self, start, count, buf):
+        self.start = start
+        self.count = count
+        self.buf = buf
+
+    def __len__(self):
+        return self.count
+
+    def key(self, i):
+        # zero copy view of the i-th cycled key, as taken by
+        # Hasher.eksSetup()
+        return memoryview(self.buf)[i*KEY_LEN:(i+1)*KEY_LEN]
+
+    def words(self):
+        # (N, 18) big endian uint32 view, as taken by
+        # LaneHasher.checkBatch() in crack.lane_worker()
+        return np.frombuffer(self.buf, dtype=">u4").reshape(-1, KEY_WORDS)
+
+
+def fill_python(keyspace, start, count, buf):
+    pos = 0
+    for pwd in keyspace.candidates(start, start+count):
+        buf[pos:pos+KEY_LEN] = cycleKey(pwd + b"\x00")
+        pos += KEY_LEN
+
+
+def low_digits(base):
+    # number of trailing digits whose counter fits into an int64
+    m = 1
+    while base**(m+1) < (1 << 62):
+        m += 1
+    return m
+
+
+def fill_numpy(keyspace, start, count, buf):
+    out = np.frombuffer(buf, dtype=np.uint8).reshape(-1, KEY_LEN)
+    charset = np.frombuffer(keyspace.charset, dtype=np.uint8)
+    base = keyspace.base
+    pos = 0
+    while pos < count:
+        index = start + pos
+        length = keyspace.length(index)
+        rest = index - keyspace.starts[length]
+        m = min(length, low_digits(base))
+        span = base**m
+        high, low = divmod(rest, span)
+        # run while the length and the leading digits stay the same
+        n = min(count - pos, span - low)
+        digits = np.empty((n, length), dtype=np.int64)
+        lows = np.arange(low, low+n, dtype=np.int64)
+        for i in range(length-1, length-1-m, -1):
+            lows, digits[:, i] = np.divmod(lows, base)
+        for i in range(length-1-m, -1, -1):
+            high, digits[:, i] = divmod(high, base)
+        key = np.zeros((n, length+1), dtype=np.uint8)
+        key[:, :length] = charset[digits]
+        out[pos:pos+n] = key[:, np.arange(KEY_LEN) % (length+1)]
+        pos += n
+
+
+def key_batches(keyspace, start, stop, batch_size=BATCH_SIZE):
+    # yield KeyBatch objects for start <= index < stop. A keyspace in
+    # another order than pwd_gen brings its own fill()
+    fill = getattr(keyspace, "fill", None)
+    if fill is None:
+        fill = fill_python if np is None else fill_numpy
+    while start < stop:
+        count = min(batch_size, stop - start)
+        buf = bytearray(count*KEY_LEN)
+        fill(keyspace, start, count, buf)
+        yield KeyBatch(start, count, buf)
+        start += count
@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+# coding: utf-8
+import asyncio
+import os
+import time
+from collections import namedtuple
+from helper import parse_hash
+from stats import FPGA_FREQUENCY, fpga_cycles
+
+# register map, see C/c_if.h
+SALT_ADDR = 0x00
+HASH_ADDR = 0x10
+PASS_ADDR = 0x28
+SREG_ADDR = 0x3f
+
+SALT_LEN = 16
+HASH_LEN = 24
+PASS_LEN = 20
+WINDOW_LEN = 64
+
+SREG_HALT = 0x00
+SREG_RESET = 0x01
+SREG_START = 0x02
+SREG_DONE = 0x10
+SREG_SUCC = 0x20
+
+DEVICE = "/dev/xillybus_mem_8"
+MAX_POLL_INTERVAL = 0.1
+
+DeviceResult = namedtuple("DeviceResult", "success password sreg window")
+
+
+def target_registers(hashed):
+    # $2a$ string -> (salt, hash, cost) in register byte order, both
+    # reversed as written by genIFFile.py. The last of the 24 hash bytes
+    # is not part of the string and sent as zero, bcrypt_quad_core.vhd
+    # leaves it out of the comparison
+    cost, salt, hash_ = parse_hash(hashed)
+    return (salt[::-1], (hash_ + b"\x00")[::-1], cost)
+
+
+def decode_password(raw):
+    # the logic stores the password as little endian 32 bit words
+    pwd = b"".join(raw[i:i+4][::-1] for i in range(0, len(raw), 4))
+    return pwd.split(b"\x00", 1)[0]
+
+
+class BcryptDevice(object):
+    # One bcrypt cracker behind a xillybus memory window. `path` can be
+    # any file with the same 64 byte register layout, e.g. the emulator.
+
+    def __init__(self, path=DEVICE, max_interval=MAX_POLL_INTERVAL):
+        self.path = path
+        self.max_interval = max_interval
+        self.fd = os.open(path, os.O_RDWR)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write_sreg(self, value):
+        os.pwrite(self.fd, bytes([value]), SREG_ADDR)
+
+    def read_window(self):
+        window = os.pread(self.fd, WINDOW_LEN, 0)
+        if len(window) != WINDOW_LEN:
+            raise OSError("%s: short read of %d bytes" %
+                          (self.path, len(window)))
+        return window
+
+    def setup(self, salt, hash_):
+        if len(salt) != SALT_LEN or len(hash_) != HASH_LEN:
+            raise ValueError("salt must be %d and hash %d bytes" %
+                             (SALT_LEN, HASH_LEN))
+        self.write_sreg(SREG_RESET)
+        # salt and hash are adjacent, one write for both
+        os.pwrite(self.fd, bytes(salt) + bytes(hash_), SALT_ADDR)
+
+    def start(self, salt, hash_):
+        self.setup(salt, hash_)
+        self.write_sreg(SREG_START)
+
+    def stop(self):
+        self.write_sreg(SREG_HALT)
+
+    def poll(self):
+        # DeviceResult once the logic is done, else None
+        window = self.read_window()
+        sreg = window[SREG_ADDR]
+        if not sreg & SREG_DONE:
+            return None
+        success = bool(sreg & SREG_SUCC)
+        pwd = None
+        if success:
+            pwd = decode_password(window[PASS_ADDR:PASS_ADDR+PASS_LEN])
+        return DeviceResult(success, pwd, sreg, window)
+
+    def intervals(self, cost):
+        # sleep backoff: start at one hash time, double up to max_interval
+        interval = fpga_cycles(cost) / FPGA_FREQUENCY
+        while True:
+            yield interval
+            interval = min(interval*2, self.max_interval)
+
+    def run_blocking(self, salt, hash_, cost, timeout=None):
+        self.start(salt, hash_)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for interval in self.intervals(cost):
+            result = self.poll()
+            if result is not None:
+                self.stop()
+                return result
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError("%s: no result after %.3g s" %
+                                   (self.path, timeout))
+            time.sleep(interval)
+
+    async def run(self, salt, hash_, cost, timeout=None):
+        self.start(salt, hash_)
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        for interval in self.intervals(cost):
+            result = self.poll()
+            if result is not None:
+                self.stop()
+                return result
+            if deadline is not None and loop.time() > deadline:
+                raise asyncio.TimeoutError("%s: no result after %.3g s" %
+                                           (self.path, timeout))
+            await asyncio.sleep(interval)
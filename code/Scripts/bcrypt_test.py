@@ -1,90 +1,22 @@
 #!/usr/bin/python3
 # coding: utf-8
+import os
 from helper import *
 from os import urandom
-import init_state
-
-dbug_foo = False
-
-
-def initState():
-    global p
-    global s0
-    global s1
-    global s2
-    global s3
-    p = list(init_state.p)
-    s0 = list(init_state.s0)
-    s1 = list(init_state.s1)
-    s2 = list(init_state.s2)
-    s3 = list(init_state.s3)
-
-
-def expandKey(salt=0, key=0, debug=False, desc="Exp ():"):
-#   key xor
-    working_key = key
-    i = 0
-    while i < 18:
-        xor_key = (working_key >> (32*(17-i))) & 0xffffffff
-        p[i] = p[i] ^ xor_key
-        i += 1
-#   setup salt for encryption loop
-    salt = (salt & ((1 << 64)-1)) << 64 | (salt >> 64)
-    c = salt & ((1 << 64)-1)
-#   replace subkeys
-    for i in range(0, 18, 2):
-        c = encrypt(c)
-        p[i] = c >> 32
-        p[i+1] = c & 0xffffffff
-        salt = (salt & ((1 << 64)-1)) << 64 | (salt >> 64)
-        c ^= salt & ((1 << 64)-1)
-
-#   replace sboxs
-    k = -1
-    for sbox in [s0, s1, s2, s3]:
-        k += 1
-        for i in range(0, 256, 2):
-            c = encrypt(c)
-            sbox[i] = c >> 32
-            sbox[i+1] = c & 0xffffffff
-            salt = (salt & ((1 << 64)-1)) << 64 | (salt >> 64)
-            c ^= salt & ((1 << 64)-1)
-    if debug:
-        printState(s0, s1, s2, s3, p, desc)
-
-
-def encrypt(ctext):
-    def round(i, j, n):
-        return ((i ^ f(j) ^ p[n]) << 32) | j
-
-    def f(z):
-        a = z >> 24 & 0xff
-        b = z >> 16 & 0xff
-        c = z >> 8 & 0xff
-        d = z & 0xff
-        return ((((s0[a] + s1[b]) & 0xffffffff) ^ s2[c]) + s3[d]) & 0xffffffff
+from hasher import key_schedule, CHECKPOINT_EVERY
+from kernel import get_hasher
 
-    global dbug_foo
-    if dbug_foo:
-        print("in ", hex(ctext))
+# state dumps of the VHDL testbench, written after each phase
+TV_FILES = {"init": "tv_init.txt", "setup": "tv_exp.txt",
+            "cost": "tv_cost.txt"}
 
-    xl = ctext >> 32
-    xr = ctext & 0xffffffff
-    xl ^= (p[0])
 
-    for i in range(1, 17, 1):
-        c = round(xr, xl, i)
-        xl = c >> 32
-        xr = c & 0xffffffff
-        if dbug_foo:
-            print("c ", hex(c))
-    c = (xr ^ p[17]) << 32 | (xl)
-    xl = c >> 32
-    xr = c & 0xffffffff
-    return c
-
-
-def bcrypt(salt, key, cost, debug=False, generate_tv_files=False):
+def bcrypt(salt, key, cost, debug=False, generate_tv_files=False,
+           hasher=None, engine="reference", stats=None, tv_dir=".",
+           resume=None, checkpoint=None, every=CHECKPOINT_EVERY):
+    # resume: snapshot bytes to continue the cost loop from, checkpoint:
+    # called with a snapshot every `every` cost loop iterations, see
+    # snapshot_writer() and load_snapshot()
     if debug:
         print("Rounds : %d" % 2**cost)
         print("SaltLen: %d" % len(salt))
@@ -94,39 +26,34 @@ def bcrypt(salt, key, cost, debug=False, generate_tv_files=False):
 
     salt = bytestring2int(salt)
     key = bytestring2int(cycleKey(key))
-
-    salt_key = (((salt << 128*3) | (salt << 128*2) | (salt << 128)
-                 | salt) << 64) | (salt >> 64)
-    writeConf(salt, key)
-
-    initState()
-    if debug:
-        printState(s0, s1, s2, s3, p, "Initstate: ")
     if generate_tv_files:
-        writeState(s0, s1, s2, s3, p, "tv_init.txt")
+        writeConf(salt, key, os.path.join(tv_dir, "tv_conf.txt"))
 
-    expandKey(salt, key, debug=debug, desc="Exp (s, k):")
-    if generate_tv_files:
-        writeState(s0, s1, s2, s3, p, "tv_exp.txt")
+    if hasher is None:
+        hasher = get_hasher(engine)
+    hasher.debug = debug
+    hasher.trace = False
+    ks = key_schedule(salt, key)
 
-#   cost loop
-    for i in range(2**cost):
-        expandKey(0, key, debug=debug, desc="Exp (k):")
-        expandKey(0, salt_key, debug=debug, desc="Exp (s):")
-    if generate_tv_files:
-        writeState(s0, s1, s2, s3, p, "tv_cost.txt")
+    def dump(phase):
+        if debug and phase == "init":
+            printState(hasher.s0, hasher.s1, hasher.s2, hasher.s3, hasher.p,
+                       "Initstate: ")
+        if generate_tv_files:
+            writeState(hasher.s0, hasher.s1, hasher.s2, hasher.s3, hasher.p,
+                       os.path.join(tv_dir, TV_FILES[phase]))
+
+    hasher.eksSchedule(ks, cost, stats, resume, checkpoint, every, dump)
 
 #   encryption
-    global dbug_foo
-    print("start encrypt")
-    dbug_foo = True
-    ctext2 = 0x4f72706865616e42
-    ctext1 = 0x65686f6c64657253
-    ctext0 = 0x637279446f756274
-    for i in range(64):
-        ctext2 = encrypt(ctext2)
-        ctext1 = encrypt(ctext1)
-        ctext0 = encrypt(ctext0)
+    if debug:
+        print("start encrypt")
+    hasher.trace = debug
+    ctext2, ctext1, ctext0 = hasher.encryptCtext()
+    hasher.trace = False
+    if stats is not None:
+        stats.mark("encrypt", 3*64)
+        stats.done(cost)
 
 #   return hash
     salt = int2bytestring(salt, 16)
@@ -138,10 +65,8 @@ def bcrypt(salt, key, cost, debug=False, generate_tv_files=False):
     result = ("$2a$%0.2d$%s%s" %
              (cost, encode_base64(salt, 16), encode_base64(ctext, 23)))
     if generate_tv_files:
-        tv_enc_f = open("tv_enc.txt", "w")
-        print("-- Format:\n-- 192 Bit Testvector", file=tv_enc_f)
-        print(value, file=tv_enc_f)
-        tv_enc_f.close()
+        with open(os.path.join(tv_dir, "tv_enc.txt"), "w") as tv_enc_f:
+            tv_enc_f.write("-- Format:\n-- 192 Bit Testvector\n%s\n" % value)
 
     return result
 
@@ -152,23 +77,88 @@ def gensalt(log_rounds=2):
     return prefix+salt
 
 
-def test():
+def test(engine="reference", max_cost=None):
+    # see kat.py, the vectors run in parallel and passes are cached
+    from kat import run
     print("running doctests")
-    count = 0
-    for tv in test_vectors:
-        cost = int(tv[1][4:6])
-        salt = decode_base64(tv[1][7:], 22)
-        key = bytes(tv[0]+'\x00', "utf-8")
-        expected = tv[2]
-        h = bcrypt(salt, key, cost, debug=False, generate_tv_files=False)
-        try:
-            assert(h == expected)
-            count += 1
-        except AssertionError:
-            print("got\n%s\nexpected\n%s" % (h, expected))
+    count, failed, cached = run(engine, max_cost)
+    for tv, h in failed:
+        print("got\n%s\nexpected\n%s" % (h, tv[2]))
     print("%d tests succeeded" % count)
 
 
+def test_registers():
+    # bcrypt_device.target_registers() against the genIFFile.py register
+    # image of a known vector: equal but for the last hash byte, which
+    # the $2a$ string does not carry and the core does not compare
+    from bcrypt_device import target_registers
+    from genIFFile import raw_hash, register_image
+    key, setting, hashed = test_vectors[4]
+    cost = int(setting[4:6])
+    salt = decode_base64(setting[7:], 22)
+    image = register_image(salt, raw_hash(cost, salt,
+                                          bytes(key + "\x00", "utf-8")))
+    salt_reg, hash_reg, cost_reg = target_registers(hashed)
+    assert cost_reg == cost
+    assert salt_reg == image[:16]
+    assert hash_reg[1:] == image[17:]
+    assert hash_reg[0] == 0
+
+
+def test_fill_numpy():
+    # the numpy fill of key_batches() writes the same keys as the Python
+    # one, across length changes and batch boundaries
+    from batches import KEY_LEN, fill_numpy, fill_python
+    from keyspace import Keyspace
+    ks = Keyspace("abc", 4)
+    for start, count in ((0, ks.size), (2, 11), (37, 50)):
+        a = bytearray(count*KEY_LEN)
+        b = bytearray(count*KEY_LEN)
+        fill_numpy(ks, start, count, a)
+        fill_python(ks, start, count, b)
+        assert a == b
+
+
+def test_telemetry_candidates():
+    # telemetry counts the candidates a core went through, not the
+    # configured count the timeouts are based on
+    import asyncio
+    from bcrypt_device import DeviceResult, target_registers
+    from keyspace import Keyspace
+    from scheduler import Scheduler
+
+    hit, miss = test_vectors[4][2], test_vectors[0][2]
+    hit_salt = target_registers(hit)[0]
+
+    class Board(object):
+        # finds "c" for the hit target, nothing for the others
+        def __init__(self, path):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+        def stop(self):
+            pass
+
+        async def run(self, salt, hash_, cost, timeout=None):
+            pwd = b"c" if salt == hit_salt else None
+            return DeviceResult(pwd is not None, pwd, 0, None)
+
+    async def run(sched, hashes):
+        return [r async for r in sched.run(hashes)]
+
+    sched = Scheduler(["board"], candidates=10**6, device=Board,
+                      keyspace=Keyspace("abcdefgh", 2), cores=4)
+    asyncio.run(run(sched, [hit, miss]))
+    searched = dict((r["success"], r["candidates"]) for r in sched.telemetry)
+    # "c" is the third of the 72 candidates, 18 per core
+    assert searched == {True: 1, False: 18}
+
+
 def gen_tv(encoded_salt, key):
     cost = 0  # int(encoded_salt[4:6])
     salt = b"\xce\x33\x5f\xbf\x78\x49\x59\xc7\x81\x33\x2a\x5d\x8d\xcd\x25\x35"
@@ -197,12 +187,6 @@ def main():
     #self.assertEqual(crypted, crypted2)
 
 
-p = []
-s0 = []
-s1 = []
-s2 = []
-s3 = []
-
 test_vectors = [
     ['', '$2a$06$DCq7YPn5Rq63x1Lad4cll.',
      '$2a$06$DCq7YPn5Rq63x1Lad4cll.TV4S6ytwfsfvkgY8jIucDrjc8deX1s.'],
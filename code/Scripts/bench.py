@@ -0,0 +1,170 @@
+#!/usr/bin/python3
+# coding: utf-8
+import json
+import os
+import platform
+from argparse import ArgumentParser
+from time import perf_counter, strftime
+from helper import *
+from kernel import ENGINES, LANE_ENGINE, get_hasher
+
+SALT = b"\xce\x33\x5f\xbf\x78\x49\x59\xc7\x81\x33\x2a\x5d\x8d\xcd\x25\x35"
+KEY = b"abc\x00"
+REGRESSION = 0.9
+
+
+def rate(fn, calls_per_fn=1, min_time=0.5):
+    # calls per second of fn, repeated until min_time has passed
+    n = 0
+    start = perf_counter()
+    while True:
+        fn()
+        n += 1
+        elapsed = perf_counter() - start
+        if elapsed >= min_time:
+            return n * calls_per_fn / elapsed
+
+
+class ScalarBench(object):
+    def __init__(self, engine):
+        self.hasher = get_hasher(engine)
+        self.salt = bytestring2int(SALT)
+        self.key = bytestring2int(cycleKey(KEY))
+
+    def encrypt(self, min_time):
+        h = self.hasher
+        return rate(lambda: h.encrypt(0x4f72706865616e42), 1, min_time)
+
+    def expandKey(self, min_time):
+        h = self.hasher
+        return rate(lambda: h.expandKey(self.salt, self.key), 1, min_time)
+
+    def bcrypt(self, cost, min_time):
+        h = self.hasher
+        return rate(lambda: h.bcrypt(SALT, KEY, cost), 1, min_time)
+
+
+class LaneBench(object):
+    def __init__(self, lanes):
+        from lanes import LaneHasher, salt_words, key_words
+        self.hasher = LaneHasher(lanes)
+        self.lanes = lanes
+        self.salt = salt_words([SALT] * lanes)
+        self.key = key_words([KEY] * lanes)
+
+    def encrypt(self, min_time):
+        h = self.hasher
+        xl = self.salt[:, 0]
+        xr = self.salt[:, 1]
+        return rate(lambda: h.encrypt(xl, xr), self.lanes, min_time)
+
+    def expandKey(self, min_time):
+        h = self.hasher
+        return rate(lambda: h.expandKey(self.key, self.salt), self.lanes,
+                    min_time)
+
+    def bcrypt(self, cost, min_time):
+        h = self.hasher
+        return rate(lambda: h.hashRaw([SALT], [KEY] * self.lanes, cost),
+                    self.lanes, min_time)
+
+
+def benches(engines, lanes):
+    for engine in engines:
+        if engine == LANE_ENGINE:
+            try:
+                yield engine, LaneBench(lanes)
+            except ImportError:
+                print("numpy not available, skipping the lane engine")
+        else:
+            yield engine, ScalarBench(engine)
+
+
+def run(engines, max_cost, min_time, budget, lanes):
+    results = {}
+    for engine, b in benches(engines, lanes):
+        print("benchmarking %s" % engine)
+        res = {"encrypt": b.encrypt(min_time),
+               "expandKey": b.expandKey(min_time),
+               "bcrypt": {}}
+        for cost in range(max_cost+1):
+            # a hash costs 2*2^cost+1 key expansions, only measure the
+            # costs that fit into the budget and extrapolate the others
+            expected = (2*2**cost+1) / res["expandKey"]
+            if expected <= budget:
+                hps = b.bcrypt(cost, min_time)
+                res["bcrypt"][str(cost)] = {"hashes/s": hps,
+                                            "estimated": False}
+            else:
+                res["bcrypt"][str(cost)] = {"hashes/s": 1 / expected,
+                                            "estimated": True}
+            print("  cost %2d: %10.3f hashes/s%s" %
+                  (cost, res["bcrypt"][str(cost)]["hashes/s"],
+                   " (estimated)" if expected > budget else ""))
+        print("  encrypt: %.0f/s, expandKey: %.2f/s" %
+              (res["encrypt"], res["expandKey"]))
+        results[engine] = res
+    return results
+
+
+def flatten(results):
+    flat = {}
+    for engine, res in results.items():
+        flat[engine+".encrypt"] = res["encrypt"]
+        flat[engine+".expandKey"] = res["expandKey"]
+        for cost, r in res["bcrypt"].items():
+            if not r["estimated"]:
+                flat[engine+".bcrypt."+cost] = r["hashes/s"]
+    return flat
+
+
+def compare(results, baseline):
+    # ratio current/baseline for every measurement present in both
+    cur = flatten(results)
+    old = flatten(baseline["results"])
+    comparison = {}
+    for k in sorted(set(cur) & set(old)):
+        ratio = cur[k] / old[k]
+        comparison[k] = {"ratio": ratio, "regression": ratio < REGRESSION}
+    return comparison
+
+
+def main():
+    parser = ArgumentParser(description="benchmark the bcrypt engines")
+    parser.add_argument("--engines", nargs="+",
+                        default=sorted(ENGINES) + [LANE_ENGINE])
+    parser.add_argument("--max-cost", type=int, default=12)
+    parser.add_argument("--min-time", type=float, default=0.5)
+    parser.add_argument("--budget", type=float, default=10.0,
+                        help="max. expected seconds per measured hash")
+    parser.add_argument("--lanes", type=int, default=64)
+    parser.add_argument("--output", default="bench_output.txt")
+    parser.add_argument("--baseline", default="bench_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = run(args.engines, args.max_cost, args.min_time, args.budget,
+                  args.lanes)
+    out = {"date": strftime("%Y-%m-%d %H:%M:%S"),
+           "python": platform.python_version(),
+           "machine": platform.machine(),
+           "cpus": os.cpu_count(),
+           "lanes": args.lanes,
+           "results": results}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        out["baseline"] = {"file": args.baseline, "date": baseline["date"]}
+        out["comparison"] = compare(results, baseline)
+        for k, c in out["comparison"].items():
+            if c["regression"]:
+                print("REGRESSION %s: %.2fx of baseline" % (k, c["ratio"]))
+    with open(args.output, "w") as f:
+        json.dump(out, f, indent=1, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(out, f, indent=1, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+# coding: utf-8
+import hashlib
+import math
+import os
+import struct
+from sys import argv, stdin, stdout, stderr
+
+CAPACITY = 10**7
+ERROR_RATE = 0.001
+# magic, bits, hash functions, capacity, error rate, added, rejected,
+# digest of the target hash (zero if the filter is not tied to one)
+HEADER = struct.Struct(">4sQIQdQQ16s")
+MAGIC = b"BLM2"
+NO_TARGET = bytes(16)
+
+
+def target_digest(target):
+    if target is None:
+        return NO_TARGET
+    if isinstance(target, str):
+        target = target.encode("ascii")
+    return hashlib.blake2b(target, digest_size=16).digest()
+
+
+class BloomFilter(object):
+    # Fixed size Bloom filter: m bits and k hash positions sized for
+    # `capacity` items at `error_rate`. Past capacity the filter keeps
+    # working, only the false positive rate rises (see error()). target:
+    # the hash string the candidates were tried against, if any.
+
+    def __init__(self, capacity=CAPACITY, error_rate=ERROR_RATE,
+                 target=None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.target = target_digest(target)
+        m = -capacity * math.log(error_rate) / math.log(2)**2
+        self.m = max(8, int(math.ceil(m / 8)) * 8)
+        self.k = max(1, int(round(self.m / capacity * math.log(2))))
+        self.bits = bytearray(self.m // 8)
+        self.added = 0
+        self.rejected = 0
+
+    def positions(self, item):
+        # double hashing of one 128 bit digest
+        d = hashlib.blake2b(item, digest_size=16).digest()
+        h1 = int.from_bytes(d[:8], "little")
+        h2 = int.from_bytes(d[8:], "little") | 1
+        m = self.m
+        return [(h1 + i*h2) % m for i in range(self.k)]
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7))
+                   for p in self.positions(item))
+
+    def add(self, item):
+        # False if item was (probably) added before
+        bits = self.bits
+        new = False
+        for p in self.positions(item):
+            mask = 1 << (p & 7)
+            if not bits[p >> 3] & mask:
+                bits[p >> 3] |= mask
+                new = True
+        if new:
+            self.added += 1
+        else:
+            self.rejected += 1
+        return new
+
+    def error(self):
+        # estimated false positive rate at the current fill
+        return (1 - math.exp(-self.k * self.added / self.m)) ** self.k
+
+    def save(self, filename):
+        tmp = filename + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, self.m, self.k, self.capacity,
+                                self.error_rate, self.added, self.rejected,
+                                self.target))
+            f.write(self.bits)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, filename)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "rb") as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            raise ValueError("%s is not a bloom filter" % filename)
+        magic, m, k, capacity, error_rate, added, rejected, target = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC or len(data) != HEADER.size + m // 8:
+            raise ValueError("%s is not a bloom filter" % filename)
+        bloom = cls(capacity, error_rate)
+        bloom.target = target
+        bloom.m = m
+        bloom.k = k
+        bloom.bits = bytearray(data[HEADER.size:])
+        bloom.added = added
+        bloom.rejected = rejected
+        return bloom
+
+    @classmethod
+    def open(cls, filename, capacity=CAPACITY, error_rate=ERROR_RATE,
+             target=None):
+        # the saved filter of a resumed job or a new one. A saved filter
+        # of another target would skip candidates never tried against
+        # this one
+        if not os.path.exists(filename):
+            return cls(capacity, error_rate, target)
+        bloom = cls.load(filename)
+        if bloom.target != target_digest(target):
+            raise ValueError("%s belongs to another target" % filename)
+        return bloom
+
+
+def dedup(candidates, bloom):
+    # drop candidates already added to bloom, the count is kept in
+    # bloom.rejected
+    for c in candidates:
+        if bloom.add(c):
+            yield c
+
+
+def main():
+    # filter candidate lines from stdin, the filter state is kept in a
+    # file so a rerun also drops what earlier runs passed
+    if len(argv) < 2:
+        print("usage: %s filterfile [capacity] [error_rate] < candidates" %
+              argv[0])
+        return
+    capacity = int(argv[2]) if len(argv) > 2 else CAPACITY
+    error_rate = float(argv[3]) if len(argv) > 3 else ERROR_RATE
+    bloom = BloomFilter.open(argv[1], capacity, error_rate)
+    rejected = bloom.rejected
+    out = stdout.buffer
+    try:
+        for line in dedup((l.rstrip(b"\r\n") for l in stdin.buffer), bloom):
+            out.write(line + b"\n")
+    finally:
+        bloom.save(argv[1])
+        stderr.write("%d duplicates removed, %d candidates seen, "
+                     "%.2g false positive rate\n" %
+                     (bloom.rejected - rejected, bloom.added, bloom.error()))
+
+
+if __name__ == "__main__":
+    main()
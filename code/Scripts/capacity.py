@@ -0,0 +1,226 @@
+#!/usr/bin/python3
+# coding: utf-8
+import json
+import math
+from argparse import ArgumentParser
+from collections import namedtuple
+from stats import FPGA_FREQUENCY, FPGA_BASE_CYCLES, FPGA_EXPAND_CYCLES
+
+SECONDS_PER_MONTH = 60 * 60 * 24 * (365/12)
+# price of one kWh
+ENERGY_PRICE = 0.1008
+BRUTE_FORCE = 62**8
+DICTIONARY = 4*10**9
+
+
+class CycleModel(object):
+    # cycles(cost) = a + b*2^(cost+1) of one core, `cores` cores clocked at
+    # `frequency`. Software engines use frequency=1, i.e. a and b in
+    # seconds.
+
+    def __init__(self, a, b, frequency=FPGA_FREQUENCY, cores=1):
+        self.a = a
+        self.b = b
+        self.frequency = frequency
+        self.cores = cores
+
+    def cycles(self, cost):
+        return self.a + self.b*2**(cost+1)
+
+    def hashes_per_second(self, cost):
+        # in the order of the paper's script, the figures are its floats
+        return self.frequency / self.cycles(cost) * self.cores
+
+    def scaled(self, cores):
+        return CycleModel(self.a, self.b, self.frequency, cores)
+
+    @classmethod
+    def fit(cls, points, frequency=FPGA_FREQUENCY, cores=1):
+        # least squares fit of (cost, cycles of one hash on one core)
+        points = list(points)
+        if len(set(cost for cost, y in points)) < 2:
+            raise ValueError("fitting the cycle model needs two costs")
+        xs = [2**(cost+1) for cost, y in points]
+        ys = [y for cost, y in points]
+        n = len(points)
+        mx = sum(xs) / n
+        my = sum(ys) / n
+        b = (sum((x-mx)*(y-my) for x, y in zip(xs, ys)) /
+             sum((x-mx)**2 for x in xs))
+        return cls(my - b*mx, b, frequency, cores)
+
+    @classmethod
+    def from_rates(cls, rates, cores=1):
+        # {cost: hashes/s} of `cores` cores, e.g. the published numbers
+        return cls.fit(((cost, cores/hps) for cost, hps in rates.items()),
+                       1, cores)
+
+    def as_dict(self):
+        return {"a": self.a, "b": self.b, "frequency": self.frequency,
+                "cores": self.cores}
+
+
+FPGA_CORE = CycleModel(FPGA_BASE_CYCLES, FPGA_EXPAND_CYCLES)
+
+Platform = namedtuple("Platform", "name model price watts")
+
+# the platforms of the paper, the software numbers are the published
+# hashes/s at cost 5 and 12
+PAPER_PLATFORMS = [
+    Platform("CPU", CycleModel.from_rates({5: 6210, 12: 50}),
+             262*1.5, 300),
+    Platform("GPU", CycleModel.from_rates({5: 1920, 12: 15}),
+             120*1.5, 300),
+    Platform("CPU+GPU", CycleModel.from_rates({5: 6210+1920, 12: 65}),
+             382*1.5, 300),
+    Platform("zedboard", FPGA_CORE.scaled(10*4), 319, 4.2),
+    Platform("Virtex7", FPGA_CORE.scaled(79*4), 3495, 20),
+    Platform("Epiphany", CycleModel.from_rates({5: 1207, 12: 9.64}),
+             149, 9.1),
+    Platform("OWzb", CycleModel.from_rates({5: 4571, 12: 64.83}),
+             319, 6.7),
+]
+
+
+def bench_model(filename, engine, cores=None):
+    # cycle model of a software engine from a bench.py output file, the
+    # single core rate times `cores` (default: the cpus of the machine)
+    with open(filename) as f:
+        bench = json.load(f)
+    points = [(int(cost), 1 / r["hashes/s"])
+              for cost, r in bench["results"][engine]["bcrypt"].items()
+              if not r["estimated"]]
+    return CycleModel.fit(points, 1, cores or bench["cpus"])
+
+
+def telemetry_model(filename, frequency=FPGA_FREQUENCY):
+    # cycle model of one FPGA core from Scheduler telemetry, only jobs
+    # that searched their whole keyspace tell the time per candidate
+    points = []
+    with open(filename) as f:
+        for line in f:
+            r = json.loads(line)
+            if not r["success"]:
+                points.append((r["cost"], r["seconds"] * frequency /
+                               r["candidates"]))
+    return CycleModel.fit(points, frequency)
+
+
+def keyspace_time(keyspace, cost, fleet):
+    # seconds to search keyspace candidates at cost with a fleet of
+    # (platform, count)
+    rate = sum(n*p.model.hashes_per_second(cost) for p, n in fleet)
+    return keyspace / rate
+
+
+def devices_needed(keyspace, cost, platform, deadline=SECONDS_PER_MONTH):
+    return int(math.ceil(keyspace / (deadline *
+                                     platform.model.hashes_per_second(cost))))
+
+
+def cost_lines(keyspace, cost, platforms, deadline=SECONDS_PER_MONTH,
+               energy_price=ENERGY_PRICE):
+    # (fixed, per attack, devices) per platform for a fleet that finishes
+    # one attack within deadline: purchase price plus energy per attack
+    lines = []
+    for p in platforms:
+        n = devices_needed(keyspace, cost, p, deadline)
+        hours = keyspace / (p.model.hashes_per_second(cost)*n) / 60 / 60
+        energy = int(math.ceil(hours * (n*p.watts) / 1000 * energy_price))
+        lines.append((n*p.price, energy, n))
+    return lines
+
+
+def break_even(lines):
+    # {attacks: total cost} where two cost lines cross
+    points = {}
+    for i, (fi, pi, ni) in enumerate(lines):
+        for j, (fj, pj, nj) in enumerate(lines):
+            if i != j and pi != pj:
+                x = (fj - fi) / (pi - pj)
+                if x > 0:
+                    points[round(x, 2)] = round(fi + x*pi, 2)
+    return points
+
+
+def pgfplots(platforms, lines, legend=True, comment="%"):
+    out = ["\t\t\\addplot{%d+%d*x}; %s%s" % (f, e, comment, p.name)
+           for p, (f, e, n) in zip(platforms, lines)]
+    out.append("\t\t\\addplot+[color=black,only marks,scatter,"
+               "scatter src=explicit symbolic] coordinates{")
+    for x, y in break_even(lines).items():
+        out.append("\t\t\t({}, {}) [a]".format(x, y))
+    out.append("\t\t};")
+    if legend:
+        out.append("\t\t\\legend{")
+        out += ["\t\t\t%s," % p.name for p in platforms]
+        out += ["\t\t\tbreak-even-points,", "\t\t}"]
+    return "\n".join(out)
+
+
+def paper(platforms):
+    # the figures of paper/latex-code-gen.py, formatted as it always
+    # printed them
+    lines = cost_lines(BRUTE_FORCE, 5, platforms)
+    out = [pgfplots(platforms, lines),
+           "needed devices for brute-force:",
+           str([n for f, e, n in lines]),
+           "\n\n dict attack \n\n"]
+    lines = cost_lines(DICTIONARY, 12, platforms)
+    out += [pgfplots(platforms, lines, False, "% "),
+            "needed devices for dict:",
+            str([n for f, e, n in lines])]
+    return "\n".join(out)
+
+
+def replace(platforms, name, model):
+    return [p._replace(model=model) if p.name == name else p
+            for p in platforms]
+
+
+def main():
+    parser = ArgumentParser(description="bcrypt cracking capacity model")
+    parser.add_argument("--bench", help="bench.py output for the CPU")
+    parser.add_argument("--engine", default="unrolled")
+    parser.add_argument("--cpus", type=int, default=None)
+    parser.add_argument("--telemetry",
+                        help="Scheduler telemetry for the FPGA cores")
+    parser.add_argument("--keyspace", type=int, default=None)
+    parser.add_argument("--cost", type=int, default=5)
+    parser.add_argument("--fleet", nargs="+", default=[],
+                        help="platform=count, e.g. zedboard=10")
+    args = parser.parse_args()
+
+    platforms = PAPER_PLATFORMS
+    if args.bench:
+        model = bench_model(args.bench, args.engine, args.cpus)
+        platforms = replace(platforms, "CPU", model)
+        print("CPU: %s" % model.as_dict())
+    if args.telemetry:
+        core = telemetry_model(args.telemetry)
+        for name, cores in (("zedboard", 10*4), ("Virtex7", 79*4)):
+            platforms = replace(platforms, name, core.scaled(cores))
+        print("FPGA core: %s" % core.as_dict())
+
+    if args.keyspace is None:
+        print(paper(platforms))
+        return
+    by_name = dict((p.name, p) for p in platforms)
+    fleet = []
+    for f in args.fleet:
+        name, count = f.split("=")
+        fleet.append((by_name[name], int(count)))
+    if fleet:
+        t = keyspace_time(args.keyspace, args.cost, fleet)
+        print("%d candidates at cost %d: %.1f s (%.2f days)" %
+              (args.keyspace, args.cost, t, t / 86400))
+    lines = cost_lines(args.keyspace, args.cost, platforms)
+    for p, (f, e, n) in zip(platforms, lines):
+        print("%-10s %8d devices for one month, %10d + %d per attack" %
+              (p.name, n, f, e))
+    for x, y in sorted(break_even(lines).items()):
+        print("break even after %.2f attacks at %.2f" % (x, y))
+
+
+if __name__ == "__main__":
+    main()
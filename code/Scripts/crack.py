@@ -0,0 +1,170 @@
+#!/usr/bin/python3
+# coding: utf-8
+import os
+import multiprocessing as mp
+from queue import Empty
+from sys import argv
+from kernel import ENGINES, LANE_ENGINE, get_hasher
+from keyspace import Keyspace
+from batches import key_batches, BATCH_SIZE
+from targets import TargetIndex, load_targets
+from potfile import Potfile
+
+# int2asc.vhd order without the NUL overflow symbol
+CHARSET = ("abcdefghijklmnopqrstuvwxyz"
+           "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789")
+
+
+def splits(keyspace, workers):
+    # (start, stop, chunk, stride) per worker: a worker searches `chunk`
+    # indices every `stride` from start on. pwd_gen order gets the same
+    # split as the FPGA cores, the last worker takes the remainder. A
+    # keyspace ordered by probability is striped in batches instead, so
+    # all workers stay at the likely front
+    if getattr(keyspace, "ordered", False):
+        return [(i*BATCH_SIZE, keyspace.size, BATCH_SIZE, workers*BATCH_SIZE)
+                for i in range(workers)]
+    return [(start, stop, stop - start, stop - start)
+            for start, stop in keyspace.leases(workers)]
+
+
+def lane_worker(keyspace, split, group, lanes, found, result):
+    # LANE_ENGINE: one checkBatch() per `lanes` candidates, no more lanes
+    # than the split hands out at once
+    from lanes import LaneHasher
+    start, stop, chunk, stride = split
+    lanes = max(1, min(lanes, chunk))
+    hasher = LaneHasher(lanes)
+    for lo in range(start, stop, stride):
+        for batch in key_batches(keyspace, lo, min(lo + chunk, stop), lanes):
+            if found.is_set():
+                return
+            for i, hit in hasher.checkBatch(group.salt, batch.words(),
+                                            group.cost, group.digests):
+                result.put((hit, keyspace.candidate(batch.start + i)))
+
+
+def worker(index, cpu, keyspace, split, group, engine, found, result,
+           lanes=None):
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {cpu})
+    if engine == LANE_ENGINE:
+        return lane_worker(keyspace, split, group, lanes, found, result)
+    hasher = get_hasher(engine)
+    start, stop, chunk, stride = split
+    for lo in range(start, stop, stride):
+        for batch in key_batches(keyspace, lo, min(lo + chunk, stop)):
+            for i in range(len(batch)):
+                if found.is_set():
+                    return
+                hasher.eksSetup(group.salt, batch.key(i), group.cost)
+                hit = hasher.matchDigests(group.digests)
+                if hit is not None:
+                    result.put((hit, keyspace.candidate(batch.start + i)))
+
+
+def crack_group(group, keyspace, workers, engine, lanes=None):
+    # {hash string: password} of one TargetGroup, stops as soon as every
+    # target of the group is cracked. lanes: candidates per batch of
+    # LANE_ENGINE
+    cpus = (sorted(os.sched_getaffinity(0))
+            if hasattr(os, "sched_getaffinity") else [None])
+    found = mp.Event()
+    result = mp.Queue()
+    procs = [mp.Process(target=worker,
+                        args=(i, cpus[i % len(cpus)], keyspace, split, group,
+                              engine, found, result, lanes))
+             for i, split in enumerate(splits(keyspace, workers))]
+    for p in procs:
+        p.start()
+    cracked = {}
+
+    def collect(timeout):
+        try:
+            while True:
+                hashes, pwd = result.get(timeout=timeout)
+                for h in hashes:
+                    cracked[h] = pwd
+                timeout = 0
+        except Empty:
+            pass
+
+    while any(p.is_alive() for p in procs) and len(cracked) < len(group):
+        collect(0.1)
+    collect(0)
+    found.set()
+    for p in procs:
+        p.terminate()
+        p.join()
+    return cracked
+
+
+def crack_many(hashes, charset=CHARSET, max_len=4, workers=None,
+               engine="unrolled", potfile=None, keyspace=None, lanes=None):
+    # brute force all hashes, one keyspace pass per (cost, salt) group.
+    # Returns {hash string: password bytes} of the cracked ones. Hashes
+    # already in potfile are skipped, new ones are added to it. keyspace
+    # replaces charset and max_len, e.g. a markov.MarkovKeyspace. lanes:
+    # batch size of LANE_ENGINE, by default lanes.autotune()
+    if keyspace is None:
+        keyspace = Keyspace(charset, max_len)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if engine == LANE_ENGINE and lanes is None:
+        from lanes import autotune
+        lanes = autotune()
+    if potfile is not None:
+        hashes = potfile.filter(hashes)
+    cracked = {}
+    for group in TargetIndex(hashes).ordered():
+        found = crack_group(group, keyspace, workers, engine, lanes)
+        if potfile is not None:
+            for hashed, pwd in found.items():
+                potfile.add(hashed, pwd)
+        cracked.update(found)
+    return cracked
+
+
+def crack(hashed, charset=CHARSET, max_len=4, workers=None,
+          engine="unrolled", potfile=None, keyspace=None):
+    # brute force `hashed` over all passwords up to max_len characters,
+    # returns the password as bytes or None
+    if potfile is not None and hashed in potfile:
+        return potfile.get(hashed)
+    return crack_many([hashed], charset, max_len, workers, engine,
+                      potfile, keyspace).get(hashed)
+
+
+def main():
+    if len(argv) < 2:
+        print("usage: %s hash|dumpfile [max_len] [charset] [workers] "
+              "[engine]" % argv[0])
+        print("engine: %s, default unrolled" %
+              ", ".join(sorted(ENGINES) + [LANE_ENGINE]))
+        return
+    max_len = int(argv[2]) if len(argv) > 2 else 4
+    charset = argv[3] if len(argv) > 3 and argv[3] else CHARSET
+    workers = int(argv[4]) if len(argv) > 4 else None
+    engine = argv[5] if len(argv) > 5 else "unrolled"
+    with Potfile() as pot:
+        if argv[1].startswith("$2"):
+            pwd = crack(argv[1], charset, max_len, workers, engine, pot)
+            if pwd is None:
+                print("Password not found")
+            else:
+                print("Found Password: %s" % pwd.decode("utf-8", "replace"))
+            return
+        hashes = load_targets(argv[1]).ordered_hashes()
+        left = pot.filter(hashes)
+        print("%d of %d already in %s" % (len(hashes) - len(left),
+                                         len(hashes), pot.filename))
+        cracked = crack_many(left, charset, max_len, workers, engine, pot)
+        for hashed in left:
+            if hashed in cracked:
+                print("%s %s" % (hashed, cracked[hashed].decode("utf-8",
+                                                                "replace")))
+        print("%d of %d cracked" % (len(cracked), len(left)))
+
+
+if __name__ == "__main__":
+    main()
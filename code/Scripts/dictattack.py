@@ -0,0 +1,219 @@
+#!/usr/bin/python3
+# coding: utf-8
+import mmap
+import os
+import multiprocessing as mp
+from queue import Empty
+from sys import argv
+from time import perf_counter
+from helper import parse_hash
+from kernel import get_hasher
+from mangle import parse_rules, expand
+from bloom import BloomFilter
+
+BATCH_SIZE = 256
+REPORT_INTERVAL = 10.0
+
+
+def read_batches(filename, offset=0, batch_size=BATCH_SIZE):
+    # yield (start, end, words) for the wordlist from byte offset on, the
+    # words stay bytes without their line ending
+    with open(filename, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = offset
+            while pos < size:
+                start = pos
+                words = []
+                while len(words) < batch_size and pos < size:
+                    end = mm.find(b"\n", pos)
+                    if end < 0:
+                        end = size
+                    word = mm[pos:end]
+                    if word.endswith(b"\r"):
+                        word = word[:-1]
+                    words.append(word)
+                    pos = end + 1
+                yield (start, min(pos, size), words)
+
+
+def worker(target, engine, batches, results, found, rules=None):
+    cost, salt, hash_ = target
+    hasher = get_hasher(engine)
+    chains = parse_rules(rules) if rules else None
+    while True:
+        batch = batches.get()
+        if batch is None:
+            return
+        start, end, words = batch
+        hit = None
+        tried = 0
+        complete = True
+        if chains is not None:
+            # mangled here, the parent only hands out wordlist offsets
+            words = expand(words, chains)
+        for word in words:
+            if found.is_set():
+                complete = False
+                break
+            tried += 1
+            if hasher.check(salt, word + b"\x00", cost, hash_):
+                hit = word
+                found.set()
+                complete = False
+                break
+        results.put((start, end, tried, hit, complete))
+
+
+class Progress(object):
+    # contiguous watermark of finished batches, so a resume never skips
+    # a batch that was still running or cut short by a hit
+    def __init__(self, offset):
+        self.offset = offset
+        self.pending = {}
+        self.count = 0
+        self.started = perf_counter()
+
+    def done(self, start, end, n, complete=True):
+        # returns the starts of the batches the watermark moved past. A
+        # batch not tried in full keeps the watermark in front of it
+        self.count += n
+        if not complete:
+            return []
+        self.pending[start] = end
+        passed = []
+        while self.offset in self.pending:
+            passed.append(self.offset)
+            self.offset = self.pending.pop(self.offset)
+        return passed
+
+    def rate(self):
+        return self.count / max(perf_counter() - self.started, 1e-9)
+
+
+def attack(hashed, wordlist, offset=0, workers=None, engine="unrolled",
+           batch_size=BATCH_SIZE, report=REPORT_INTERVAL, rules=None,
+           bloom=None):
+    # returns (password or None, resume offset, tried candidates). rules:
+    # a mangle.py rule spec applied to every word. bloom: a bloom.py
+    # BloomFilter file of this target, candidates tried by earlier runs
+    # are skipped. Only batches tried in full and below the resume offset
+    # go into the filter, it is saved with every report and on exit
+    chains = parse_rules(rules) if rules else None
+    seen = None
+    if bloom is not None:
+        # dedup needs every candidate in one place, mangle here
+        seen = BloomFilter.open(bloom, target=hashed)
+        rules = None
+    # candidates of dispatched batches by batch start, not in seen yet
+    staged = {}
+    inflight = set()
+    skipped = 0
+    if workers is None:
+        workers = os.cpu_count() or 1
+    target = parse_hash(hashed)
+    batches = mp.Queue(maxsize=2*workers)
+    results = mp.Queue()
+    found = mp.Event()
+    procs = [mp.Process(target=worker,
+                        args=(target, engine, batches, results, found,
+                              rules))
+             for i in range(workers)]
+    for p in procs:
+        p.start()
+
+    progress = Progress(offset)
+    outstanding = 0
+    pwd = None
+    last_report = perf_counter()
+    finished = False
+
+    def fresh(words):
+        nonlocal skipped
+        for w in words:
+            if w in seen or w in inflight:
+                skipped += 1
+                continue
+            inflight.add(w)
+            yield w
+
+    def commit(passed):
+        for start in passed:
+            words = staged.pop(start)
+            inflight.difference_update(words)
+            for w in words:
+                seen.add(w)
+
+    def collect(block):
+        nonlocal outstanding, pwd
+        try:
+            while outstanding:
+                start, end, n, hit, complete = results.get(block, 1.0)
+                outstanding -= 1
+                passed = progress.done(start, end, n, complete)
+                if seen is not None:
+                    commit(passed)
+                if hit is not None:
+                    pwd = hit
+        except Empty:
+            pass
+
+    try:
+        for batch in read_batches(wordlist, offset, batch_size):
+            if found.is_set():
+                break
+            if seen is not None:
+                start, end, words = batch
+                if chains is not None:
+                    words = expand(words, chains)
+                words = list(fresh(words))
+                staged[start] = words
+                batch = (start, end, words)
+            batches.put(batch)
+            outstanding += 1
+            collect(False)
+            if perf_counter() - last_report >= report:
+                last_report = perf_counter()
+                print("%d candidates, %.2f candidates/s, resume at %d" %
+                      (progress.count, progress.rate(), progress.offset))
+                if seen is not None:
+                    seen.save(bloom)
+        while outstanding:
+            collect(True)
+        finished = True
+        for p in procs:
+            batches.put(None)
+    finally:
+        for p in procs:
+            if not finished:
+                p.terminate()
+            p.join()
+        if seen is not None:
+            seen.save(bloom)
+    if seen is not None:
+        print("%d duplicate candidates skipped" % skipped)
+    return (pwd, progress.offset, progress.count)
+
+
+def main():
+    if len(argv) < 3:
+        print("usage: %s hash wordlist [offset] [workers] [rules] "
+              "[bloomfile]" % argv[0])
+        return
+    offset = int(argv[3]) if len(argv) > 3 else 0
+    workers = int(argv[4]) if len(argv) > 4 else None
+    rules = argv[5] if len(argv) > 5 and argv[5] else None
+    bloom = argv[6] if len(argv) > 6 else None
+    pwd, offset, count = attack(argv[1], argv[2], offset, workers,
+                                rules=rules, bloom=bloom)
+    if pwd is None:
+        print("Password not found (%d candidates, resume at %d)" %
+              (count, offset))
+    else:
+        print("Found Password: %s" % pwd.decode("utf-8", "replace"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+# coding: utf-8
+import os
+import threading
+import time
+from math import ceil
+from sys import argv
+from bcrypt_device import (SALT_ADDR, SALT_LEN, HASH_ADDR, HASH_LEN,
+                           PASS_ADDR, PASS_LEN, SREG_ADDR, WINDOW_LEN,
+                           SREG_RESET, SREG_START, SREG_DONE, SREG_SUCC)
+from batches import key_batches
+from crack import CHARSET
+from helper import cycleKey
+from keyspace import Keyspace
+from kernel import get_hasher
+from scheduler import TIMEOUT_MARGIN, expected_runtime
+from stats import FPGA_FREQUENCY, fpga_cycles
+
+POLL_INTERVAL = 0.001
+EMULATED_CORES = 40
+# candidates between two checks of the status register
+ABORT_INTERVAL = 16
+# set by the emulator while a job runs, the host clearing it (the HALT of
+# BcryptDevice.stop()) aborts the job. Not part of c_if.h
+SREG_RUNNING = 0x04
+# ctext bytes bcrypt_quad_core compares, the 24th is masked out
+COMPARED_LEN = 23
+# hashes timed by main() for the software rate
+RATE_SAMPLES = 4
+
+
+def encode_password(pwd):
+    # inverse of bcrypt_device.decode_password()
+    raw = pwd[:PASS_LEN].ljust(PASS_LEN, b"\x00")
+    return b"".join(raw[i:i+4][::-1] for i in range(0, PASS_LEN, 4))
+
+
+class Emulator(object):
+    # Serves the 64 byte register window of c_if.h from a plain file.
+    # START runs the software engine over the pwd_gen keyspace and DONE is
+    # reported after the time `cores` bcrypt cores at `frequency` would
+    # need for the candidates tried, scaled by time_scale.
+
+    def __init__(self, path, charset=CHARSET, max_len=4, time_scale=1.0,
+                 cores=EMULATED_CORES, frequency=FPGA_FREQUENCY,
+                 engine="unrolled"):
+        self.path = path
+        self.keyspace = Keyspace(charset, max_len)
+        self.time_scale = time_scale
+        self.cores = cores
+        self.frequency = frequency
+        self.hasher = get_hasher(engine)
+        self.jobs = 0
+        # power on state, all registers cleared
+        with open(path, "wb") as f:
+            f.write(bytes(WINDOW_LEN))
+        self.fd = os.open(path, os.O_RDWR)
+        self.stopped = threading.Event()
+
+    def close(self):
+        os.close(self.fd)
+
+    def latency(self, cost, tried):
+        return (self.time_scale * tried * fpga_cycles(cost) /
+                (self.frequency * self.cores))
+
+    def aborted(self):
+        # a RESET, a new START or a HALT from the host cancels the running
+        # job
+        sreg = os.pread(self.fd, 1, SREG_ADDR)[0]
+        return (self.stopped.is_set() or sreg & (SREG_RESET | SREG_START) or
+                not sreg & SREG_RUNNING)
+
+    def software_time(self, cost, candidates):
+        # seconds the software engine needs for `candidates` hashes
+        salt = bytes(SALT_LEN)
+        key = cycleKey(b"\x00")
+        started = time.monotonic()
+        for i in range(RATE_SAMPLES):
+            self.hasher.eksSetup(salt, key, cost)
+            self.hasher.matchCtext(bytes(COMPARED_LEN))
+        return candidates * (time.monotonic() - started) / RATE_SAMPLES
+
+    def search(self, salt, hash_, cost):
+        # (password or None, candidates tried), in pwd_gen order. tried is
+        # None if the job was aborted
+        tried = 0
+        for batch in key_batches(self.keyspace, 0, self.keyspace.size,
+                                 ABORT_INTERVAL):
+            if self.aborted():
+                return (None, None)
+            for i in range(len(batch)):
+                tried += 1
+                self.hasher.eksSetup(salt, batch.key(i), cost)
+                if self.hasher.matchCtext(hash_):
+                    return (self.keyspace.candidate(batch.start + i), tried)
+        return (None, tried)
+
+    def run_job(self, window, cost):
+        started = time.monotonic()
+        salt = window[SALT_ADDR:SALT_ADDR+SALT_LEN][::-1]
+        # the same bits the core compares: 23 of the 24 target bytes
+        hash_ = window[HASH_ADDR:HASH_ADDR+HASH_LEN][::-1][:COMPARED_LEN]
+        pwd, tried = self.search(salt, hash_, cost)
+        if tried is None:
+            return
+        done = started + self.latency(cost, tried)
+        while time.monotonic() < done:
+            if self.aborted():
+                return
+            self.stopped.wait(min(POLL_INTERVAL, done - time.monotonic()))
+        if self.aborted():
+            return
+        sreg = SREG_DONE
+        if pwd is not None:
+            os.pwrite(self.fd, encode_password(pwd), PASS_ADDR)
+            sreg |= SREG_SUCC
+        os.pwrite(self.fd, bytes([sreg]), SREG_ADDR)
+        self.jobs += 1
+
+    def serve(self, cost):
+        # the register map has no cost field, the emulated cores run with
+        # a fixed cost like the synthesized design
+        while not self.stopped.is_set():
+            window = os.pread(self.fd, WINDOW_LEN, 0)
+            sreg = window[SREG_ADDR]
+            if sreg & SREG_RESET:
+                os.pwrite(self.fd, bytes(PASS_LEN), PASS_ADDR)
+            elif sreg & SREG_START:
+                os.pwrite(self.fd, bytes([SREG_RUNNING]), SREG_ADDR)
+                self.run_job(window, cost)
+                continue
+            self.stopped.wait(POLL_INTERVAL)
+
+    def start(self, cost):
+        self.thread = threading.Thread(target=self.serve, args=(cost,),
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.close()
+
+
+def main():
+    if len(argv) < 3:
+        print("usage: %s path cost [max_len] [time_scale]" % argv[0])
+        return
+    max_len = int(argv[3]) if len(argv) > 3 else 4
+    time_scale = float(argv[4]) if len(argv) > 4 else 1.0
+    emu = Emulator(argv[1], max_len=max_len, time_scale=time_scale)
+    cost = int(argv[2])
+    print("emulating %s, cost %s" % (argv[1], cost))
+    # DONE comes after the modelled time, but never before the software
+    # search is through the keyspace: stretch the scheduler's timeout by
+    # the rate the software falls short of the model
+    candidates = -(-emu.keyspace.size // emu.cores)
+    size = emu.keyspace.size
+    needed = max(emu.latency(cost, size), emu.software_time(cost, size))
+    margin = max(TIMEOUT_MARGIN, TIMEOUT_MARGIN * needed /
+                 expected_runtime(cost, candidates))
+    print("scheduler.py --max-len %d --margin %g" %
+          (max_len, ceil(margin*10) / 10))
+    try:
+        emu.serve(cost)
+    except KeyboardInterrupt:
+        pass
+    emu.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/python3
+# coding: utf-8
+import binascii
+from collections import Counter
+from sys import argv
+from helper import B64C, BCRYPT2STD, encode_base64
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# "$2a$NN$" + 22 salt chars + 31 hash chars
+HASH_LINE = 60
+RECORD_LEN = HASH_LINE + 1
+SALT_LEN = 16
+HASH_LEN = 24
+VARIANTS = b"aby"
+CHUNK_SIZE = 1 << 22
+
+
+def valid_line(line):
+    return (len(line) == HASH_LINE and line[:2] == b"$2" and
+            line[2] in VARIANTS and line[3] == 0x24 and
+            line[4:6].isdigit() and line[6] == 0x24 and
+            not line[7:].translate(None, B64C.encode("ascii")))
+
+
+def a2b(chars):
+    # bcrypt base64 of whole 4 char groups, no padding
+    return binascii.a2b_base64(chars.translate(BCRYPT2STD))
+
+
+class HashDump(object):
+    # n hashes as flat byte arrays: one byte of cost and variant, 16 bytes
+    # of salt and 24 bytes of hash (the 23 of the string and a zero byte,
+    # as in the register window) per hash
+
+    def __init__(self):
+        self.variant = bytearray()
+        self.cost = bytearray()
+        self.salt = bytearray()
+        self.hash = bytearray()
+        self.skipped = 0
+
+    def __len__(self):
+        return len(self.cost)
+
+    def extend(self, other):
+        self.variant += other.variant
+        self.cost += other.cost
+        self.salt += other.salt
+        self.hash += other.hash
+        self.skipped += other.skipped
+
+    def target(self, i):
+        # (cost, salt, hash) as returned by helper.parse_hash()
+        return (self.cost[i], bytes(self.salt[i*SALT_LEN:(i+1)*SALT_LEN]),
+                bytes(self.hash[i*HASH_LEN:(i+1)*HASH_LEN-1]))
+
+    def registers(self, i):
+        # (salt, hash, cost) as returned by bcrypt_device.target_registers()
+        return (bytes(self.salt[i*SALT_LEN:(i+1)*SALT_LEN][::-1]),
+                bytes(self.hash[i*HASH_LEN:(i+1)*HASH_LEN][::-1]),
+                self.cost[i])
+
+    def hashed(self, i):
+        cost, salt, hash_ = self.target(i)
+        return "$2%s$%0.2d$%s%s" % (chr(self.variant[i]), cost,
+                                    encode_base64(salt, 16),
+                                    encode_base64(hash_, 23))
+
+    def costs(self):
+        # (N,) uint8 view
+        return np.frombuffer(self.cost, dtype=np.uint8)
+
+    def salts(self):
+        # (N, 16) uint8 view
+        return np.frombuffer(self.salt, dtype=np.uint8).reshape(-1, SALT_LEN)
+
+    def hashes(self):
+        # (N, 24) uint8 view
+        return np.frombuffer(self.hash, dtype=np.uint8).reshape(-1, HASH_LEN)
+
+
+def decode_python(records, dump):
+    n = len(records) // RECORD_LEN
+    lines = [records[i:i+HASH_LINE]
+             for i in range(0, n*RECORD_LEN, RECORD_LEN)]
+    dump.variant = bytearray(l[2] for l in lines)
+    dump.cost = bytearray(int(l[4:6]) for l in lines)
+    salt = a2b(b"".join(l[7:29] + b".." for l in lines))
+    hash_ = a2b(b"".join(l[29:60] + b"." for l in lines))
+    for i in range(n):
+        dump.salt += salt[i*18:i*18+SALT_LEN]
+        dump.hash += hash_[i*HASH_LEN:(i+1)*HASH_LEN-1] + b"\x00"
+
+
+def decode_numpy(records, dump):
+    lines = np.frombuffer(records, dtype=np.uint8).reshape(-1, RECORD_LEN)
+    n = len(lines)
+    dump.variant = bytearray(lines[:, 2].tobytes())
+    cost = (lines[:, 4] - 48)*10 + lines[:, 5] - 48
+    dump.cost = bytearray(cost.astype(np.uint8).tobytes())
+    # pad the 22 salt and 31 hash chars to whole 4 char groups
+    chars = np.full((n, 24), ord("."), dtype=np.uint8)
+    chars[:, :22] = lines[:, 7:29]
+    salt = np.frombuffer(a2b(chars.tobytes()), dtype=np.uint8)
+    dump.salt = bytearray(salt.reshape(n, 18)[:, :SALT_LEN].tobytes())
+    chars = np.full((n, 32), ord("."), dtype=np.uint8)
+    chars[:, :31] = lines[:, 29:60]
+    hash_ = np.frombuffer(a2b(chars.tobytes()), dtype=np.uint8).copy()
+    hash_.reshape(n, HASH_LEN)[:, -1] = 0
+    dump.hash = bytearray(hash_.tobytes())
+
+
+def aligned(chunk):
+    # every line a well formed hash and "\n" terminated, checked per column
+    if np is None or len(chunk) % RECORD_LEN:
+        return False
+    lines = np.frombuffer(chunk, dtype=np.uint8).reshape(-1, RECORD_LEN)
+    digits = lines[:, 4:6]
+    body = lines[:, 7:HASH_LINE].tobytes()
+    return bool((lines[:, 0] == 0x24).all() and
+                (lines[:, 1] == 0x32).all() and
+                np.isin(lines[:, 2], list(VARIANTS)).all() and
+                (lines[:, 3] == 0x24).all() and (lines[:, 6] == 0x24).all() and
+                ((digits >= 0x30) & (digits <= 0x39)).all() and
+                (lines[:, HASH_LINE] == 0x0a).all() and
+                not body.translate(None, B64C.encode("ascii")))
+
+
+def parse_chunk(chunk):
+    # HashDump of the complete lines in chunk, malformed lines are counted
+    # in `skipped`
+    dump = HashDump()
+    if aligned(chunk):
+        records = chunk
+    else:
+        lines = [l.strip() for l in chunk.split(b"\n")]
+        lines = [l for l in lines if l]
+        good = [l for l in lines if valid_line(l)]
+        dump.skipped = len(lines) - len(good)
+        records = b"".join(l + b"\n" for l in good)
+    if records:
+        (decode_python if np is None else decode_numpy)(records, dump)
+    return dump
+
+
+def iter_dump(filename, chunk_size=CHUNK_SIZE):
+    # yield one HashDump per chunk of whole lines
+    with open(filename, "rb") as f:
+        rest = b""
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            data = rest + data
+            end = data.rfind(b"\n") + 1
+            rest = data[end:]
+            if end:
+                yield parse_chunk(data[:end])
+        if rest:
+            yield parse_chunk(rest + b"\n")
+
+
+def load_dump(filename, chunk_size=CHUNK_SIZE):
+    dump = HashDump()
+    for part in iter_dump(filename, chunk_size):
+        dump.extend(part)
+    return dump
+
+
+def main():
+    if len(argv) < 2:
+        print("usage: %s dumpfile" % argv[0])
+        return
+    dump = load_dump(argv[1])
+    print("hashes\t%d" % len(dump))
+    print("skipped\t%d" % dump.skipped)
+    for cost, n in sorted(Counter(dump.cost).items()):
+        print("cost %0.2d\t%d" % (cost, n))
+
+
+if __name__ == "__main__":
+    main()
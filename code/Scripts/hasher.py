@@ -0,0 +1,303 @@
+#!/usr/bin/python3
+# coding: utf-8
+import os
+import struct
+import zlib
+from array import array
+from collections import namedtuple
+from helper import *
+from stats import EXPAND_ENCRYPTS
+import init_state
+
+P_LEN = 18
+SBOX_LEN = 256
+STATE_LEN = P_LEN + 4*SBOX_LEN
+
+# word offsets of P and the four sboxes inside the state buffer
+P_OFF = 0
+S0_OFF = P_LEN
+S1_OFF = S0_OFF + SBOX_LEN
+S2_OFF = S1_OFF + SBOX_LEN
+S3_OFF = S2_OFF + SBOX_LEN
+
+# 'I' is 32 bit on every platform we care about, fall back to 'L' otherwise
+WORD = 'I' if array('I').itemsize == 4 else 'L'
+
+TEMPLATE = array(WORD, init_state.p + init_state.s0 + init_state.s1 +
+                 init_state.s2 + init_state.s3)
+
+CTEXT = (0x4f72706865616e42, 0x65686f6c64657253, 0x637279446f756274)
+
+# the 32 bit words expandKey() consumes, split once per hash: key and
+# salt_key are 18 words for the P xor, salt the 4 words of the salt
+KeySchedule = namedtuple("KeySchedule", "key salt salt_key")
+
+
+def split_words(value, count):
+    # big int -> tuple of `count` big endian 32 bit words
+    return tuple((value >> (32*(count-1-i))) & 0xffffffff
+                 for i in range(count))
+
+
+def key_schedule(salt, key):
+    # salt: 16 bytes or 128 bit int, key: 72 cycled bytes or 576 bit int
+    if isinstance(salt, int):
+        salt = split_words(salt, 4)
+    else:
+        salt = struct.unpack(">4I", salt)
+    if isinstance(key, int):
+        key = split_words(key, P_LEN)
+    else:
+        key = struct.unpack(">18I", key)
+    # the cost loop key: the salt four times, then its first half again
+    return KeySchedule(key, salt, salt*4 + salt[:2])
+
+
+# cost loop snapshot: magic, cost, the number of finished iterations and
+# a crc32 of key and salt words, followed by the 1042 state words
+SNAPSHOT_MAGIC = b"BCS1"
+SNAPSHOT_HEADER = struct.Struct(">4sBxxxII")
+SNAPSHOT_STATE = struct.Struct(">%dI" % STATE_LEN)
+SNAPSHOT_LEN = SNAPSHOT_HEADER.size + SNAPSHOT_STATE.size
+CHECKPOINT_EVERY = 64
+
+
+def schedule_check(ks):
+    return zlib.crc32(struct.pack(">22I", *(ks.key + ks.salt)))
+
+
+def snapshot_writer(filename):
+    # checkpoint callback that replaces filename atomically, a process
+    # killed while writing leaves the previous snapshot behind
+    def write(data):
+        tmp = filename + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, filename)
+    return write
+
+
+def load_snapshot(filename):
+    # snapshot bytes or None if there is none yet
+    try:
+        with open(filename, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+class Hasher(object):
+    # One EksBlowfish state (P-array followed by s0..s3) in a single
+    # contiguous buffer. Instances are not shared, keep one per thread or
+    # worker process and reuse it for every hash.
+
+    def __init__(self, debug=False):
+        self.state = array(WORD, TEMPLATE)
+        self.debug = debug
+        self.trace = False
+        view = memoryview(self.state)
+        self.p = view[P_OFF:S0_OFF]
+        self.s0 = view[S0_OFF:S1_OFF]
+        self.s1 = view[S1_OFF:S2_OFF]
+        self.s2 = view[S2_OFF:S3_OFF]
+        self.s3 = view[S3_OFF:STATE_LEN]
+
+    def initState(self):
+        self.state[:] = TEMPLATE
+
+    def loadState(self, words):
+        self.state[:] = array(WORD, words)
+
+    def snapshot(self, ks, cost, iteration):
+        # state after `iteration` cost loop iterations as SNAPSHOT_LEN bytes
+        return (SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, cost, iteration,
+                                     schedule_check(ks)) +
+                SNAPSHOT_STATE.pack(*self.state))
+
+    def restore(self, data, ks, cost):
+        # load a snapshot() of the same key, salt and cost, returns the
+        # iteration to continue with
+        if len(data) != SNAPSHOT_LEN:
+            raise ValueError("snapshot has %d bytes, expected %d" %
+                             (len(data), SNAPSHOT_LEN))
+        magic, cost_, iteration, check = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("not a bcrypt snapshot")
+        if cost_ != cost or check != schedule_check(ks):
+            raise ValueError("snapshot of another key, salt or cost")
+        if iteration > 2**cost:
+            raise ValueError("snapshot iteration %d out of range" % iteration)
+        self.loadState(SNAPSHOT_STATE.unpack_from(data,
+                                                  SNAPSHOT_HEADER.size))
+        return iteration
+
+    def expandKey(self, salt=0, key=0, desc="Exp ():"):
+        # salt and key as ints, see expandWords()
+        self.expandWords(split_words(key, P_LEN),
+                         split_words(salt, 4) if salt else None, desc)
+
+    def expandWords(self, key, salt=None, desc="Exp ():"):
+        # key: 18 words, salt: 4 words or None for the zero salt of the
+        # cost loop. Block k is xored with the second salt half for even
+        # and with the first for odd k
+        p = self.state
+        for i in range(18):
+            p[i] ^= key[i]
+        if salt is None:
+            c = 0
+            for i in range(0, STATE_LEN, 2):
+                c = self.encrypt(c)
+                p[i] = c >> 32
+                p[i+1] = c & 0xffffffff
+        else:
+            halves = ((salt[2] << 32) | salt[3], (salt[0] << 32) | salt[1])
+            c = halves[1]
+            for i in range(0, STATE_LEN, 2):
+                c = self.encrypt(c)
+                p[i] = c >> 32
+                p[i+1] = c & 0xffffffff
+                c ^= halves[(i >> 1) & 1]
+        if self.debug:
+            printState(self.s0, self.s1, self.s2, self.s3, self.p, desc)
+
+    def encrypt(self, ctext):
+        s = self.state
+
+        def round(i, j, n):
+            return ((i ^ f(j) ^ s[n]) << 32) | j
+
+        def f(z):
+            a = z >> 24 & 0xff
+            b = z >> 16 & 0xff
+            c = z >> 8 & 0xff
+            d = z & 0xff
+            return ((((s[S0_OFF+a] + s[S1_OFF+b]) & 0xffffffff)
+                     ^ s[S2_OFF+c]) + s[S3_OFF+d]) & 0xffffffff
+
+        if self.trace:
+            print("in ", hex(ctext))
+
+        xl = ctext >> 32
+        xr = ctext & 0xffffffff
+        xl ^= (s[0])
+
+        for i in range(1, 17, 1):
+            c = round(xr, xl, i)
+            xl = c >> 32
+            xr = c & 0xffffffff
+            if self.trace:
+                print("c ", hex(c))
+        c = (xr ^ s[17]) << 32 | (xl)
+        return c
+
+    def eksSetup(self, salt, key, cost, stats=None):
+        # salt and key as ints or bytes, key already cycled to 72 bytes
+        self.eksSchedule(key_schedule(salt, key), cost, stats)
+
+    def eksSchedule(self, ks, cost, stats=None, resume=None,
+                    checkpoint=None, every=CHECKPOINT_EVERY, phase=None):
+        # ks: a KeySchedule, no big ints past this point. resume: a
+        # snapshot() to continue from instead of starting over,
+        # checkpoint: called with a snapshot() every `every` iterations,
+        # phase: called with "init", "setup" and "cost" once the state of
+        # that phase is complete, e.g. for the test vector dumps
+        if stats is not None:
+            stats.start()
+        if resume is None:
+            self.initState()
+            if stats is not None:
+                stats.mark("init")
+            if phase is not None:
+                phase("init")
+            self.expandWords(ks.key, ks.salt, desc="Exp (s, k):")
+            if stats is not None:
+                stats.mark("setup", EXPAND_ENCRYPTS)
+            if phase is not None:
+                phase("setup")
+            start = 0
+        else:
+            start = self.restore(resume, ks, cost)
+        self.costLoop(ks, cost, start, checkpoint, every)
+        if stats is not None:
+            stats.mark("cost", 2*(2**cost-start)*EXPAND_ENCRYPTS)
+        if phase is not None:
+            phase("cost")
+
+    def costLoop(self, ks, cost, start=0, checkpoint=None,
+                 every=CHECKPOINT_EVERY):
+        key = ks.key
+        salt_key = ks.salt_key
+        rounds = 2**cost
+        if checkpoint is None:
+            every = rounds
+        for chunk in range(start, rounds, every):
+            for i in range(chunk, min(chunk + every, rounds)):
+                self.expandWords(key, desc="Exp (k):")
+                self.expandWords(salt_key, desc="Exp (s):")
+            if checkpoint is not None and i + 1 < rounds:
+                checkpoint(self.snapshot(ks, cost, i + 1))
+
+    def encryptCtext(self):
+        ctext2, ctext1, ctext0 = CTEXT
+        for i in range(64):
+            ctext2 = self.encrypt(ctext2)
+            ctext1 = self.encrypt(ctext1)
+            ctext0 = self.encrypt(ctext0)
+        return (ctext2, ctext1, ctext0)
+
+    def encryptBlock(self, ctext):
+        for i in range(64):
+            ctext = self.encrypt(ctext)
+        return ctext
+
+    def matchCtext(self, hash_, stats=None):
+        # compare against the 23 raw hash bytes of a $2a$ string. Only
+        # ctext2 is encrypted for a mismatch, ctext1/ctext0 on a hit only
+        if self.encryptBlock(CTEXT[0]) != bytestring2int(hash_[:8]):
+            if stats is not None:
+                stats.mark("encrypt", 64)
+            return False
+        ctext1 = self.encryptBlock(CTEXT[1])
+        ctext0 = self.encryptBlock(CTEXT[2])
+        if stats is not None:
+            stats.mark("encrypt", 3*64)
+        return int2bytestring((ctext1 << 64) | ctext0, 16)[:15] == hash_[8:]
+
+    def matchDigests(self, digests, stats=None):
+        # digests as in targets.TargetGroup: {first ctext block: {last 15
+        # hash bytes: value}}. The value of the matching target or None,
+        # the early reject of matchCtext() with any number of targets
+        tails = digests.get(self.encryptBlock(CTEXT[0]))
+        if tails is None:
+            if stats is not None:
+                stats.mark("encrypt", 64)
+            return None
+        ctext1 = self.encryptBlock(CTEXT[1])
+        ctext0 = self.encryptBlock(CTEXT[2])
+        if stats is not None:
+            stats.mark("encrypt", 3*64)
+        return tails.get(int2bytestring((ctext1 << 64) | ctext0, 16)[:15])
+
+    def check(self, salt, key, cost, hash_, stats=None):
+        # salt: 16 raw bytes, key: NUL terminated, hash_: 23 raw bytes
+        self.eksSetup(salt, cycleKey(key), cost, stats)
+        match = self.matchCtext(hash_, stats)
+        if stats is not None:
+            stats.done(cost)
+        return match
+
+    def bcrypt(self, salt, key, cost, stats=None, resume=None,
+               checkpoint=None, every=CHECKPOINT_EVERY):
+        # salt: 16 raw bytes, key: NUL terminated password bytes, see
+        # eksSchedule() for resume and checkpoint
+        self.eksSchedule(key_schedule(salt, cycleKey(key)), cost, stats,
+                         resume, checkpoint, every)
+        ctext2, ctext1, ctext0 = self.encryptCtext()
+        if stats is not None:
+            stats.mark("encrypt", 3*64)
+            stats.done(cost)
+        ctext = int2bytestring((ctext2 << 128) | (ctext1 << 64) | ctext0, 24)
+        return ("$2a$%0.2d$%s%s" %
+                (cost, encode_base64(salt, 16), encode_base64(ctext, 23)))
@@ -0,0 +1,147 @@
+#!/usr/bin/python3
+# coding: utf-8
+import hashlib
+import json
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+from helper import *
+from kernel import ENGINES, LANE_ENGINE, get_hasher
+from bcrypt_test import bcrypt, test_vectors
+
+QUICK_COST = 6
+CACHE = "kat_cache.json"
+
+_hasher = None
+
+
+def engine_hash(engine):
+    # sha256 over the source of every module the engine's hasher class,
+    # the bcrypt_test.bcrypt() driver and the helpers they run on come from
+    modules = set(["helper", "init_state"])
+    if engine == LANE_ENGINE:
+        modules.update(["lanes", "hasher"])
+    else:
+        modules.add("bcrypt_test")
+        modules.update(cls.__module__ for cls in ENGINES[engine].__mro__
+                       if cls is not object)
+    h = hashlib.sha256()
+    for name in sorted(modules):
+        with open(sys.modules[name].__file__, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def vector_key(engine_digest, tv):
+    return "%s %s %s" % (engine_digest, tv[0], tv[2])
+
+
+def load_cache(filename):
+    try:
+        with open(filename) as f:
+            return set(json.load(f))
+    except FileNotFoundError:
+        return set()
+
+
+def save_cache(filename, cache):
+    with open(filename, "w") as f:
+        json.dump(sorted(cache), f, indent=1)
+
+
+def _init_worker(engine):
+    global _hasher
+    _hasher = get_hasher(engine)
+
+
+def check_vector(tv):
+    # [(tv, computed hash)] through bcrypt_test.bcrypt(), the driver of
+    # the test vector files, on the worker's hasher
+    key, setting, expected = tv
+    cost = int(setting[4:6])
+    salt = decode_base64(setting[7:], 22)
+    return [(tv, bcrypt(salt, bytes(key + "\x00", "utf-8"), cost,
+                        hasher=_hasher))]
+
+
+def check_lanes(tvs):
+    # [(tv, computed hash)] for vectors of one cost, one lane each
+    from lanes import LaneHasher
+    cost = int(tvs[0][1][4:6])
+    salts = [decode_base64(tv[1][7:], 22) for tv in tvs]
+    keys = [bytes(tv[0] + "\x00", "utf-8") for tv in tvs]
+    return list(zip(tvs, LaneHasher(len(tvs)).bcrypt(salts, keys, cost)))
+
+
+def cost_groups(vectors):
+    groups = {}
+    for tv in vectors:
+        groups.setdefault(int(tv[1][4:6]), []).append(tv)
+    return list(groups.values())
+
+
+def run(engine="unrolled", max_cost=None, jobs=None, cache=CACHE):
+    # check test_vectors up to max_cost, returns (passed, failed, cached).
+    # Passing vectors are remembered per engine source, reruns of an
+    # unchanged engine skip them. LANE_ENGINE needs numpy
+    if engine == LANE_ENGINE:
+        import lanes
+    digest = engine_hash(engine)
+    passed = load_cache(cache) if cache else set()
+    vectors = [tv for tv in test_vectors
+               if max_cost is None or int(tv[1][4:6]) <= max_cost]
+    todo = [tv for tv in vectors if vector_key(digest, tv) not in passed]
+    # largest costs first so the pool does not wait on a straggler
+    todo.sort(key=lambda tv: -int(tv[1][4:6]))
+    ok = len(vectors) - len(todo)
+    failed = []
+    if todo:
+        if engine == LANE_ENGINE:
+            pool = ProcessPoolExecutor(jobs)
+            work = [(check_lanes, tvs) for tvs in cost_groups(todo)]
+        else:
+            pool = ProcessPoolExecutor(jobs, initializer=_init_worker,
+                                       initargs=(engine,))
+            work = [(check_vector, tv) for tv in todo]
+        with pool:
+            for f in as_completed([pool.submit(*w) for w in work]):
+                for tv, got in f.result():
+                    if got == tv[2]:
+                        ok += 1
+                        passed.add(vector_key(digest, tv))
+                    else:
+                        failed.append((tv, got))
+        if cache:
+            save_cache(cache, passed)
+    return (ok, failed, len(vectors) - len(todo))
+
+
+def main():
+    parser = ArgumentParser(description="bcrypt known-answer tests")
+    parser.add_argument("--engine", default="unrolled",
+                        choices=sorted(ENGINES) + [LANE_ENGINE])
+    parser.add_argument("--quick", action="store_true",
+                        help="only the cost %d vectors" % QUICK_COST)
+    parser.add_argument("--max-cost", type=int, default=None)
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--cache", default=CACHE)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    max_cost = QUICK_COST if args.quick else args.max_cost
+    start = perf_counter()
+    try:
+        ok, failed, cached = run(args.engine, max_cost, args.jobs,
+                                 None if args.no_cache else args.cache)
+    except ImportError:
+        parser.error("numpy is needed for the %s engine" % LANE_ENGINE)
+    for tv, got in failed:
+        print("got\n%s\nexpected\n%s" % (got, tv[2]))
+    print("%d tests succeeded (%d cached), %d failed in %.1f s" %
+          (ok, cached, len(failed), perf_counter() - start))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+# coding: utf-8
+from array import array
+from helper import *
+from hasher import (Hasher, WORD, TEMPLATE, CTEXT,
+                    S0_OFF, S1_OFF, S2_OFF, S3_OFF, STATE_LEN)
+
+P_TEMPLATE = list(TEMPLATE[:S0_OFF])
+S0_TEMPLATE = list(TEMPLATE[S0_OFF:S1_OFF])
+S1_TEMPLATE = list(TEMPLATE[S1_OFF:S2_OFF])
+S2_TEMPLATE = list(TEMPLATE[S2_OFF:S3_OFF])
+S3_TEMPLATE = list(TEMPLATE[S3_OFF:STATE_LEN])
+
+
+def gen_rounds(indent, local_p=False):
+    # 16 Blowfish rounds on the locals xl/xr, without swapping them.
+    # local_p reads the subkeys from the locals p0..p17 instead of p[]
+    pad = " " * indent
+    pk = "p%d" if local_p else "p[%d]"
+    lines = [pad + "xl ^= " + pk % 0]
+    for i in range(1, 17):
+        a, b = ("xl", "xr") if i % 2 else ("xr", "xl")
+        lines.append(pad + "%s ^= ((((s0[%s >> 24] + s1[%s >> 16 & 0xff])"
+                     " ^ s2[%s >> 8 & 0xff]) + s3[%s & 0xff]) & 0xffffffff)"
+                     " ^ %s" % (b, a, a, a, a, pk % i))
+    lines.append(pad + "xr ^= " + pk % 17)
+    return "\n".join(lines)
+
+
+def gen_kernel():
+    # encrypt_n: n chained encryptions of (xl, xr)
+    # expand_state: expandKey with a salt. P is replaced first, after that
+    # it is constant and bound to locals while all four sboxes are filled
+    # in one loop. Block k is xored with (sc, sd) for even and (sa, sb)
+    # for odd k, the loops do two blocks per iteration so the alternation
+    # is fixed in the code. P has 9 blocks, the sboxes start with an odd k
+    # expand_state0: expandKey with the zero salt of the cost loop
+    return '''
+def encrypt_n(xl, xr, n, p, s0, s1, s2, s3):
+    %(bind_p)s = p
+    for _ in range(n):
+%(rounds8_local)s
+        xl, xr = xr, xl
+    return xl, xr
+
+
+def expand_state(p, s0, s1, s2, s3, key, sa, sb, sc, sd):
+    for i in range(18):
+        p[i] ^= key[i]
+    xl = sa
+    xr = sb
+    for i in range(0, 16, 4):
+%(rounds8)s
+        p[i] = xr
+        p[i+1] = xl
+        xl, xr = xr ^ sc, xl ^ sd
+%(rounds8)s
+        p[i+2] = xr
+        p[i+3] = xl
+        xl, xr = xr ^ sa, xl ^ sb
+%(rounds4)s
+    p[16] = xr
+    p[17] = xl
+    xl, xr = xr ^ sc, xl ^ sd
+    %(bind_p)s = p
+    for box in (s0, s1, s2, s3):
+        for i in range(0, 256, 4):
+%(rounds12_local)s
+            box[i] = xr
+            box[i+1] = xl
+            xl, xr = xr ^ sa, xl ^ sb
+%(rounds12_local)s
+            box[i+2] = xr
+            box[i+3] = xl
+            xl, xr = xr ^ sc, xl ^ sd
+
+
+def expand_state0(p, s0, s1, s2, s3, key):
+    for i in range(18):
+        p[i] ^= key[i]
+    xl = 0
+    xr = 0
+    for i in range(0, 18, 2):
+%(rounds8)s
+        p[i] = xr
+        p[i+1] = xl
+        xl, xr = xr, xl
+    %(bind_p)s = p
+    for box in (s0, s1, s2, s3):
+        for i in range(0, 256, 2):
+%(rounds12_local)s
+            box[i] = xr
+            box[i+1] = xl
+            xl, xr = xr, xl
+''' % {"bind_p": ", ".join("p%d" % i for i in range(18)),
+       "rounds4": gen_rounds(4),
+       "rounds8": gen_rounds(8),
+       "rounds8_local": gen_rounds(8, True),
+       "rounds12_local": gen_rounds(12, True)}
+
+
+KERNEL_SOURCE = gen_kernel()
+_kernel = {}
+exec(compile(KERNEL_SOURCE, "<bcrypt kernel>", "exec"), _kernel)
+encrypt_n = _kernel["encrypt_n"]
+expand_state = _kernel["expand_state"]
+expand_state0 = _kernel["expand_state0"]
+
+
+class FastHasher(Hasher):
+    # Hasher running on the generated, unrolled kernel. P and the sboxes
+    # are kept as separate lists for the fastest possible lookups.
+
+    def __init__(self, debug=False):
+        self.debug = debug
+        self.trace = False
+        self.p = list(P_TEMPLATE)
+        self.s0 = list(S0_TEMPLATE)
+        self.s1 = list(S1_TEMPLATE)
+        self.s2 = list(S2_TEMPLATE)
+        self.s3 = list(S3_TEMPLATE)
+
+    @property
+    def state(self):
+        return array(WORD, self.p + self.s0 + self.s1 + self.s2 + self.s3)
+
+    def initState(self):
+        self.p[:] = P_TEMPLATE
+        self.s0[:] = S0_TEMPLATE
+        self.s1[:] = S1_TEMPLATE
+        self.s2[:] = S2_TEMPLATE
+        self.s3[:] = S3_TEMPLATE
+
+    def loadState(self, words):
+        self.p[:] = words[:S0_OFF]
+        self.s0[:] = words[S0_OFF:S1_OFF]
+        self.s1[:] = words[S1_OFF:S2_OFF]
+        self.s2[:] = words[S2_OFF:S3_OFF]
+        self.s3[:] = words[S3_OFF:STATE_LEN]
+
+    def expandWords(self, key, salt=None, desc="Exp ():"):
+        if salt is None:
+            expand_state0(self.p, self.s0, self.s1, self.s2, self.s3, key)
+        else:
+            expand_state(self.p, self.s0, self.s1, self.s2, self.s3, key,
+                         *salt)
+        if self.debug:
+            printState(self.s0, self.s1, self.s2, self.s3, self.p, desc)
+
+    def encrypt(self, ctext):
+        xl, xr = encrypt_n(ctext >> 32, ctext & 0xffffffff, 1, self.p,
+                           self.s0, self.s1, self.s2, self.s3)
+        return (xl << 32) | xr
+
+    def encryptBlock(self, ctext):
+        xl, xr = encrypt_n(ctext >> 32, ctext & 0xffffffff, 64, self.p,
+                           self.s0, self.s1, self.s2, self.s3)
+        return (xl << 32) | xr
+
+    def encryptCtext(self):
+        return tuple(self.encryptBlock(c) for c in CTEXT)
+
+
+ENGINES = {
+    "reference": Hasher,
+    "unrolled": FastHasher,
+}
+# lanes.LaneHasher, batches of candidates in lockstep. Needs numpy and
+# has no get_hasher() instance
+LANE_ENGINE = "numpy"
+
+
+def get_hasher(engine="reference", debug=False):
+    if engine not in ENGINES:
+        raise ValueError("unknown engine %r, use one of %s" %
+                         (engine, ", ".join(sorted(ENGINES))))
+    return ENGINES[engine](debug=debug)
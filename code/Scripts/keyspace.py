@@ -0,0 +1,187 @@
+#!/usr/bin/python3
+# coding: utf-8
+import json
+import os
+from sys import argv
+from time import perf_counter
+from helper import parse_hash
+
+CHECKPOINT_INTERVAL = 64
+
+
+class Keyspace(object):
+    # All passwords over `charset` with min_len..max_len characters, in
+    # pwd_gen order: shorter first, the last character running fastest.
+    # Index i maps to a candidate by exact mixed radix integer math.
+
+    def __init__(self, charset, max_len, min_len=1):
+        if isinstance(charset, str):
+            charset = charset.encode("utf-8")
+        if len(set(charset)) != len(charset):
+            raise ValueError("charset contains duplicates")
+        self.charset = bytes(charset)
+        self.base = len(charset)
+        self.min_len = min_len
+        self.max_len = max_len
+        # first index of every length
+        self.starts = {}
+        n = 0
+        for length in range(min_len, max_len+1):
+            self.starts[length] = n
+            n += self.base**length
+        self.size = n
+
+    def length(self, index):
+        for length in range(self.max_len, self.min_len-1, -1):
+            if index >= self.starts[length]:
+                return length
+
+    def digits(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError("index %d outside of keyspace" % index)
+        length = self.length(index)
+        rest = index - self.starts[length]
+        digits = [0]*length
+        for i in range(length-1, -1, -1):
+            rest, digits[i] = divmod(rest, self.base)
+        return digits
+
+    def candidate(self, index):
+        return bytes(self.charset[d] for d in self.digits(index))
+
+    def index(self, candidate):
+        n = 0
+        for c in candidate:
+            n = n*self.base + self.charset.index(c)
+        return self.starts[len(candidate)] + n
+
+    def candidates(self, start, stop):
+        # all candidates with start <= index < stop
+        if start >= stop:
+            return
+        digits = self.digits(start)
+        charset = self.charset
+        base = self.base
+        for n in range(stop - start):
+            yield bytes(charset[d] for d in digits)
+            i = len(digits) - 1
+            while i >= 0:
+                digits[i] += 1
+                if digits[i] < base:
+                    break
+                digits[i] = 0
+                i -= 1
+            if i < 0:
+                digits = [0]*(len(digits)+1)
+
+    def leases(self, nodes):
+        # the pwds() split of init_pwd.py, but the last lease runs to the
+        # end of the keyspace instead of dropping the remainder
+        per_node = self.size // nodes
+        return [(i*per_node, (i+1)*per_node if i < nodes-1 else self.size)
+                for i in range(nodes)]
+
+    def describe(self):
+        return {"charset": self.charset.decode("latin-1"),
+                "min_len": self.min_len, "max_len": self.max_len}
+
+
+class Lease(object):
+    # Index range [start, stop) of a keyspace whose progress is kept in a
+    # json checkpoint file, so a restarted node continues at `position`
+
+    def __init__(self, keyspace, start, stop, checkpoint=None):
+        self.keyspace = keyspace
+        self.start = start
+        self.stop = stop
+        self.position = start
+        self.checkpoint = checkpoint
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self.load()
+
+    def load(self):
+        with open(self.checkpoint) as f:
+            cp = json.load(f)
+        if (cp["keyspace"] != self.keyspace.describe() or
+                cp["start"] != self.start or cp["stop"] != self.stop):
+            raise ValueError("checkpoint %s belongs to another lease" %
+                             self.checkpoint)
+        self.position = cp["position"]
+
+    def save(self):
+        if self.checkpoint is None:
+            return
+        tmp = self.checkpoint + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"keyspace": self.keyspace.describe(),
+                       "start": self.start, "stop": self.stop,
+                       "position": self.position}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint)
+
+    def done(self):
+        return self.position >= self.stop
+
+    def remaining(self):
+        return max(self.stop - self.position, 0)
+
+    def chunks(self, size=CHECKPOINT_INTERVAL):
+        # yield (index, candidates) chunks from the checkpointed position,
+        # call advance() once a chunk is finished
+        pos = self.position
+        while pos < self.stop:
+            stop = min(pos + size, self.stop)
+            yield pos, list(self.keyspace.candidates(pos, stop))
+            pos = stop
+
+    def advance(self, index):
+        self.position = index
+        self.save()
+
+
+def run(hashed, lease, engine="unrolled"):
+    # brute force one lease, checkpointing after every chunk
+    from kernel import get_hasher
+    cost, salt, hash_ = parse_hash(hashed)
+    hasher = get_hasher(engine)
+    started = perf_counter()
+    tried = 0
+    for index, chunk in lease.chunks():
+        for i, pwd in enumerate(chunk):
+            if hasher.check(salt, pwd + b"\x00", cost, hash_):
+                lease.advance(index + i + 1)
+                return pwd
+        tried += len(chunk)
+        lease.advance(index + len(chunk))
+        print("%d/%d done, %.2f candidates/s" %
+              (lease.position - lease.start, lease.stop - lease.start,
+               tried / (perf_counter() - started)))
+    return None
+
+
+def main():
+    if len(argv) < 4:
+        print("usage: %s charset max_len nodes [hash node checkpoint]" %
+              argv[0])
+        return
+    keyspace = Keyspace(argv[1], int(argv[2]))
+    leases = keyspace.leases(int(argv[3]))
+    if len(argv) < 7:
+        print("keyspace size\t%d" % keyspace.size)
+        for i, (start, stop) in enumerate(leases):
+            print("lease %d\t%d..%d\t%s..%s" %
+                  (i, start, stop-1, keyspace.candidate(start).decode(),
+                   keyspace.candidate(stop-1).decode()))
+        return
+    start, stop = leases[int(argv[5])]
+    lease = Lease(keyspace, start, stop, argv[6])
+    pwd = run(argv[4], lease)
+    if pwd is None:
+        print("Password not found in lease")
+    else:
+        print("Found Password: %s" % pwd.decode("utf-8", "replace"))
+
+
+if __name__ == "__main__":
+    main()
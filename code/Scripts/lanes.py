@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+# coding: utf-8
+from time import perf_counter
+import numpy as np
+from helper import *
+from hasher import (TEMPLATE, STATE_LEN, P_LEN, CTEXT,
+                    S0_OFF, S1_OFF, S2_OFF, S3_OFF)
+
+LANE_BYTES = STATE_LEN * 4
+DEFAULT_CACHE = 1 << 20
+
+NP_TEMPLATE = np.array(TEMPLATE, dtype=np.uint32)
+
+
+def cache_size(level=2):
+    # size of the per core data/unified cache, as reported by sysfs
+    base = "/sys/devices/system/cpu/cpu0/cache/"
+    try:
+        for i in range(8):
+            with open(base + "index%d/level" % i) as f:
+                if int(f.read()) != level:
+                    continue
+            with open(base + "index%d/type" % i) as f:
+                if f.read().strip() == "Instruction":
+                    continue
+            with open(base + "index%d/size" % i) as f:
+                size = f.read().strip()
+            mult = {"K": 1 << 10, "M": 1 << 20}.get(size[-1], 1)
+            return int(size.rstrip("KM")) * mult
+    except (OSError, ValueError):
+        pass
+    return DEFAULT_CACHE
+
+
+def cache_lanes(cache=None):
+    # largest power of two lane count whose states fit into the cache
+    if cache is None:
+        cache = cache_size()
+    lanes = 1
+    while (lanes * 2) * LANE_BYTES <= cache:
+        lanes *= 2
+    return lanes
+
+
+def key_words(keys):
+    # NUL terminated keys -> (N, 18) big endian words of the cycled key
+    buf = b"".join(cycleKey(k) for k in keys)
+    return np.frombuffer(buf, dtype=">u4").astype(np.uint32).reshape(-1, 18)
+
+
+def salt_words(salts):
+    # 16 byte salts -> (N, 4) big endian words
+    buf = b"".join(bytes(s) for s in salts)
+    return np.frombuffer(buf, dtype=">u4").astype(np.uint32).reshape(-1, 4)
+
+
+class LaneHasher(object):
+    # N independent EksBlowfish states, hashed in lockstep. Row i of
+    # `state` has the same layout as Hasher.state.
+
+    def __init__(self, lanes):
+        self.lanes = lanes
+        self.state = np.empty((lanes, STATE_LEN), dtype=np.uint32)
+        self.flat = self.state.reshape(-1)
+        self.rows = np.arange(lanes, dtype=np.intp) * STATE_LEN
+        self.initState()
+
+    def initState(self):
+        self.state[:] = NP_TEMPLATE
+
+    def encrypt(self, xl, xr):
+        st = self.state
+        flat = self.flat
+        r0 = self.rows + S0_OFF
+        r1 = self.rows + S1_OFF
+        r2 = self.rows + S2_OFF
+        r3 = self.rows + S3_OFF
+        xl = xl ^ st[:, 0]
+        for i in range(1, 17):
+            f = flat[r0 + (xl >> 24)] + flat[r1 + ((xl >> 16) & 0xff)]
+            f ^= flat[r2 + ((xl >> 8) & 0xff)]
+            f += flat[r3 + (xl & 0xff)]
+            xr = xr ^ f ^ st[:, i]
+            xl, xr = xr, xl
+        return xr ^ st[:, 17], xl
+
+    def expandKey(self, key, salt=None):
+        # key: (N, 18) words, salt: (N, 4) words or None for a zero salt
+        st = self.state
+        st[:, :P_LEN] ^= key
+        if salt is None:
+            xl = np.zeros(self.lanes, dtype=np.uint32)
+            xr = np.zeros(self.lanes, dtype=np.uint32)
+        else:
+            xl = salt[:, 0].copy()
+            xr = salt[:, 1].copy()
+        for i in range(0, STATE_LEN, 2):
+            xl, xr = self.encrypt(xl, xr)
+            st[:, i] = xl
+            st[:, i+1] = xr
+            if salt is not None:
+                j = 2 if i & 2 == 0 else 0
+                xl = xl ^ salt[:, j]
+                xr = xr ^ salt[:, j+1]
+
+    def eksSetup(self, salt, key, cost):
+        salt_key = np.concatenate([salt, salt, salt, salt, salt[:, :2]],
+                                  axis=1)
+        self.initState()
+        self.expandKey(key, salt)
+        for i in range(2**cost):
+            self.expandKey(key)
+            self.expandKey(salt_key)
+
+    def encryptCtext(self):
+        ctext = []
+        for c in CTEXT:
+            xl = np.full(self.lanes, c >> 32, dtype=np.uint32)
+            xr = np.full(self.lanes, c & 0xffffffff, dtype=np.uint32)
+            for i in range(64):
+                xl, xr = self.encrypt(xl, xr)
+            ctext += [xl, xr]
+        # (N, 6) words: ctext2, ctext1, ctext0
+        return np.stack(ctext, axis=1)
+
+    def matchDigests(self, digests):
+        # [(lane, hash strings)] of the lanes producing a target of
+        # TargetGroup.digests, see Hasher.matchDigests(). ctext1 and
+        # ctext0 are only computed when ctext2 matched in some lane
+        xl = np.full(self.lanes, CTEXT[0] >> 32, dtype=np.uint32)
+        xr = np.full(self.lanes, CTEXT[0] & 0xffffffff, dtype=np.uint32)
+        for i in range(64):
+            xl, xr = self.encrypt(xl, xr)
+        first = (xl.astype(np.uint64) << np.uint64(32)) | xr
+        hit = np.isin(first, np.array(list(digests), dtype=np.uint64))
+        if not hit.any():
+            return []
+        raw = self.encryptCtext().astype(">u4")
+        hits = []
+        for i in np.flatnonzero(hit):
+            hashes = digests[int(first[i])].get(raw[i].tobytes()[8:23])
+            if hashes:
+                hits.append((int(i), hashes))
+        return hits
+
+    def checkBatch(self, salt, key, cost, digests):
+        # key: (n, 18) words, e.g. KeyBatch.words(), salt: 16 raw bytes.
+        # Returns [(index of the key, hash strings)] of the keys producing
+        # a target of digests
+        n = len(key)
+        if n > self.lanes:
+            raise ValueError("%d candidates for %d lanes" % (n, self.lanes))
+        key = np.asarray(key, dtype=np.uint32)
+        if n < self.lanes:
+            key = np.concatenate([key, np.repeat(key[:1], self.lanes-n, 0)])
+        self.eksSetup(np.repeat(salt_words([salt]), self.lanes, 0), key, cost)
+        return [(i, hashes) for i, hashes in self.matchDigests(digests)
+                if i < n]
+
+    def hashRaw(self, salts, keys, cost):
+        n = len(keys)
+        if n > self.lanes:
+            raise ValueError("%d candidates for %d lanes" % (n, self.lanes))
+        salt = salt_words(salts)
+        key = key_words(keys)
+        if len(salt) == 1:
+            salt = np.repeat(salt, n, axis=0)
+        # pad the unused lanes with a copy of the first candidate
+        pad = self.lanes - n
+        if pad:
+            salt = np.concatenate([salt, np.repeat(salt[:1], pad, 0)])
+            key = np.concatenate([key, np.repeat(key[:1], pad, 0)])
+        self.eksSetup(salt, key, cost)
+        return self.encryptCtext()[:n]
+
+    def bcrypt(self, salts, keys, cost):
+        # salts: one salt for all lanes or one per key
+        if len(salts) == 1:
+            salts = list(salts) * len(keys)
+        raw = self.hashRaw(salts, keys, cost).astype(">u4")
+        return ["$2a$%0.2d$%s%s" % (cost, encode_base64(salt, 16),
+                                    encode_base64(row.tobytes(), 23))
+                for salt, row in zip(salts, raw)]
+
+
+def autotune(candidates=None, cost=0):
+    # time one eksSetup per lane count and return the count with the best
+    # hashes per second, starting from the cache derived estimate
+    if candidates is None:
+        top = cache_lanes()
+        candidates = [top >> i for i in range(4, 0, -1) if top >> i > 0]
+        candidates += [top, top * 2, top * 4]
+    key = np.zeros((1, 18), dtype=np.uint32)
+    salt = np.zeros((1, 4), dtype=np.uint32)
+    best, best_rate = candidates[0], 0.0
+    for lanes in candidates:
+        lh = LaneHasher(lanes)
+        start = perf_counter()
+        lh.eksSetup(np.repeat(salt, lanes, 0), np.repeat(key, lanes, 0), cost)
+        rate = lanes / (perf_counter() - start)
+        if rate > best_rate:
+            best, best_rate = lanes, rate
+    return best
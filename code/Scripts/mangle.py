@@ -0,0 +1,163 @@
+#!/usr/bin/python3
+# coding: utf-8
+from collections import OrderedDict
+from sys import argv
+from batches import KEY_LEN
+from bloom import BloomFilter, dedup as bloom_dedup
+
+# longer passwords hash like their first 72 bytes
+MAX_PASSWORD = KEY_LEN
+DEDUP_WINDOW = 1 << 16
+DEFAULT_RULES = "none,capitalize,digits,capitalize+digits,leet"
+
+LEET = bytes.maketrans(b"aeiostAEIOST", b"431057431057")
+YEARS = [str(y).encode("ascii") for y in range(1970, 2031)]
+DIGITS = [str(d).encode("ascii") for d in range(10)]
+APPEND_DIGITS = DIGITS + [b"%02d" % d for d in range(100)]
+
+
+def rule_none(word):
+    yield word
+
+
+def rule_lower(word):
+    yield word.lower()
+
+
+def rule_upper(word):
+    yield word.upper()
+
+
+def rule_capitalize(word):
+    yield word.capitalize()
+
+
+def rule_toggle(word):
+    # every single character case toggle
+    for i in range(len(word)):
+        c = word[i:i+1]
+        t = c.swapcase()
+        if t != c:
+            yield word[:i] + t + word[i+1:]
+
+
+def rule_digits(word):
+    for d in APPEND_DIGITS:
+        yield word + d
+
+
+def rule_prepend(word):
+    for d in DIGITS:
+        yield d + word
+
+
+def rule_years(word):
+    for y in YEARS:
+        yield word + y
+
+
+def rule_leet(word):
+    yield word.translate(LEET)
+
+
+RULES = {
+    "none": rule_none,
+    "lower": rule_lower,
+    "upper": rule_upper,
+    "capitalize": rule_capitalize,
+    "toggle": rule_toggle,
+    "digits": rule_digits,
+    "prepend": rule_prepend,
+    "years": rule_years,
+    "leet": rule_leet,
+}
+
+
+def parse_rules(spec=DEFAULT_RULES):
+    # "a,b+c" -> [(a,), (b, c)]: every chain is applied on its own, the
+    # rules of a chain one after the other
+    chains = []
+    for chain in spec.split(","):
+        names = [n.strip() for n in chain.split("+") if n.strip()]
+        for n in names:
+            if n not in RULES:
+                raise ValueError("unknown rule %r, use one of %s" %
+                                 (n, ", ".join(sorted(RULES))))
+        chains.append(tuple(RULES[n] for n in names))
+    return chains
+
+
+def apply_rule(words, rule):
+    for w in words:
+        yield from rule(w)
+
+
+def apply_chain(words, chain):
+    for rule in chain:
+        words = apply_rule(words, rule)
+    return words
+
+
+def mangle(word, chains):
+    # the variants of one word, without repeats among them
+    seen = set()
+    for chain in chains:
+        for v in apply_chain((word,), chain):
+            if v not in seen:
+                seen.add(v)
+                yield v
+
+
+def expand(words, chains, max_len=MAX_PASSWORD):
+    for word in words:
+        for v in mangle(word, chains):
+            if len(v) <= max_len:
+                yield v
+
+
+def dedup(candidates, window=DEDUP_WINDOW):
+    # drop candidates seen among the last `window` distinct ones
+    recent = OrderedDict()
+    for c in candidates:
+        if c in recent:
+            recent.move_to_end(c)
+            continue
+        recent[c] = None
+        if len(recent) > window:
+            recent.popitem(last=False)
+        yield c
+
+
+def wordlist(filename):
+    from dictattack import read_batches
+    for start, end, words in read_batches(filename):
+        yield from words
+
+
+def pipeline(words, rules=DEFAULT_RULES, max_len=MAX_PASSWORD,
+             window=DEDUP_WINDOW, bloom=None):
+    # words -> rules -> length filter -> dedup, all lazy. With a
+    # bloom.BloomFilter duplicates are dropped across the whole run (and
+    # earlier runs sharing the filter) instead of a recent window
+    candidates = expand(words, parse_rules(rules), max_len)
+    if bloom is not None:
+        return bloom_dedup(candidates, bloom)
+    return dedup(candidates, window)
+
+
+def main():
+    if len(argv) < 2:
+        print("usage: %s wordlist [rules] [bloomfile]" % argv[0])
+        print("rules: comma separated chains of %s joined by +, default %s" %
+              (", ".join(sorted(RULES)), DEFAULT_RULES))
+        return
+    rules = argv[2] if len(argv) > 2 else DEFAULT_RULES
+    bloom = BloomFilter.open(argv[3]) if len(argv) > 3 else None
+    for c in pipeline(wordlist(argv[1]), rules, bloom=bloom):
+        print(c.decode("utf-8", "replace"))
+    if bloom is not None:
+        bloom.save(argv[3])
+
+
+if __name__ == "__main__":
+    main()
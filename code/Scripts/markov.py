@@ -0,0 +1,255 @@
+#!/usr/bin/python3
+# coding: utf-8
+import hashlib
+import json
+from bisect import bisect_right
+from math import log2
+from sys import argv
+from batches import fill_python
+from keyspace import Keyspace
+
+# a level is half a bit of probability below the most likely choice,
+# everything less likely than MAX_LEVEL is cut to MAX_LEVEL
+LEVEL_SCALE = 2
+MAX_LEVEL = 15
+
+
+def levels(counts):
+    # add one smoothed counts -> integer levels, 0 for the most likely
+    total = sum(counts) + len(counts)
+    best = (max(counts) + 1) / total
+    return [min(MAX_LEVEL, int(round(-log2((n + 1) / total / best) *
+                                     LEVEL_SCALE)))
+            for n in counts]
+
+
+class MarkovModel(object):
+    # First order Markov counts over a charset: the first character, every
+    # character pair and the length of the training words
+
+    def __init__(self, charset, max_len, min_len=1):
+        if isinstance(charset, str):
+            charset = charset.encode("utf-8")
+        self.charset = bytes(charset)
+        self.min_len = min_len
+        self.max_len = max_len
+        base = len(charset)
+        self.start = [0]*base
+        self.trans = [[0]*base for i in range(base)]
+        self.length = [0]*(max_len+1)
+
+    def train(self, words):
+        # words outside the charset or the length range are skipped
+        pos = dict((c, i) for i, c in enumerate(self.charset))
+        n = 0
+        for word in words:
+            if not self.min_len <= len(word) <= self.max_len:
+                continue
+            try:
+                digits = [pos[c] for c in word]
+            except KeyError:
+                continue
+            self.start[digits[0]] += 1
+            for a, b in zip(digits, digits[1:]):
+                self.trans[a][b] += 1
+            self.length[len(word)] += 1
+            n += 1
+        return n
+
+    def as_dict(self):
+        return {"charset": self.charset.decode("latin-1"),
+                "min_len": self.min_len, "max_len": self.max_len,
+                "start": self.start, "trans": self.trans,
+                "length": self.length}
+
+    def save(self, filename):
+        with open(filename, "w") as f:
+            json.dump(self.as_dict(), f, sort_keys=True)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as f:
+            d = json.load(f)
+        model = cls(d["charset"].encode("latin-1"), d["max_len"],
+                    d["min_len"])
+        model.start = d["start"]
+        model.trans = d["trans"]
+        model.length = d["length"]
+        return model
+
+
+class MarkovKeyspace(object):
+    # The passwords of a Keyspace in ascending total level (descending
+    # estimated probability) of length, first character and every
+    # transition. Ties go to the shorter password, then charset order.
+    # Index i maps to a candidate by counting, so leases work as for
+    # Keyspace and every password is in the keyspace exactly once.
+
+    ordered = True
+
+    def __init__(self, model):
+        self.model = model
+        self.charset = model.charset
+        self.base = len(self.charset)
+        self.min_len = model.min_len
+        self.max_len = model.max_len
+        self.start_level = levels(model.start)
+        self.trans_level = [levels(row) for row in model.trans]
+        lengths = range(model.min_len, model.max_len+1)
+        length_level = levels([model.length[l] for l in lengths])
+        self.length_level = dict(zip(lengths, length_level))
+        self.max_total = MAX_LEVEL*(model.max_len + 1)
+        self.count_suffixes()
+        self.count_buckets()
+        self.size = self.bucket_starts[-1] + self.buckets[-1][2]
+
+    def count_suffixes(self):
+        # suffix[r][p][b]: strings of r characters following character p
+        # whose transition levels sum up to b
+        base = self.base
+        width = MAX_LEVEL*self.max_len + 1
+        row = [1] + [0]*(width-1)
+        self.suffix = [[row]*base]
+        for r in range(1, self.max_len):
+            prev = self.suffix[-1]
+            cur = []
+            for p in range(base):
+                counts = [0]*width
+                for c, level in enumerate(self.trans_level[p]):
+                    following = prev[c]
+                    for b in range(level, width):
+                        counts[b] += following[b - level]
+                cur.append(counts)
+            self.suffix.append(cur)
+
+    def first_count(self, length, c, budget):
+        b = budget - self.start_level[c]
+        if b < 0 or b >= len(self.suffix[length-1][c]):
+            return 0
+        return self.suffix[length-1][c][b]
+
+    def count_buckets(self):
+        # (total level, length, candidates) in enumeration order
+        self.buckets = []
+        self.bucket_starts = []
+        self.bucket_index = {}
+        n = 0
+        for total in range(self.max_total + 1):
+            for length in range(self.min_len, self.max_len+1):
+                budget = total - self.length_level[length]
+                if budget < 0:
+                    continue
+                count = sum(self.first_count(length, c, budget)
+                            for c in range(self.base))
+                if count:
+                    self.bucket_index[(total, length)] = len(self.buckets)
+                    self.buckets.append((total, length, count))
+                    self.bucket_starts.append(n)
+                    n += count
+
+    def digits(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError("index %d outside of keyspace" % index)
+        i = bisect_right(self.bucket_starts, index) - 1
+        total, length, count = self.buckets[i]
+        rest = index - self.bucket_starts[i]
+        budget = total - self.length_level[length]
+        for c in range(self.base):
+            n = self.first_count(length, c, budget)
+            if rest < n:
+                break
+            rest -= n
+        digits = [c]
+        budget -= self.start_level[c]
+        for r in range(length-2, -1, -1):
+            p = digits[-1]
+            for c, level in enumerate(self.trans_level[p]):
+                b = budget - level
+                n = self.suffix[r][c][b] if b >= 0 else 0
+                if rest < n:
+                    break
+                rest -= n
+            digits.append(c)
+            budget -= self.trans_level[p][c]
+        return digits
+
+    def candidate(self, index):
+        return bytes(self.charset[d] for d in self.digits(index))
+
+    def level(self, candidate):
+        digits = [self.charset.index(c) for c in candidate]
+        return (self.length_level[len(digits)] +
+                self.start_level[digits[0]] +
+                sum(self.trans_level[a][b]
+                    for a, b in zip(digits, digits[1:])))
+
+    def index(self, candidate):
+        digits = [self.charset.index(c) for c in candidate]
+        length = len(digits)
+        total = self.level(candidate)
+        n = self.bucket_starts[self.bucket_index[(total, length)]]
+        budget = total - self.length_level[length]
+        n += sum(self.first_count(length, c, budget)
+                 for c in range(digits[0]))
+        budget -= self.start_level[digits[0]]
+        for pos in range(1, length):
+            p = digits[pos-1]
+            r = length - 1 - pos
+            for c in range(digits[pos]):
+                b = budget - self.trans_level[p][c]
+                if b >= 0:
+                    n += self.suffix[r][c][b]
+            budget -= self.trans_level[p][digits[pos]]
+        return n
+
+    def candidates(self, start, stop):
+        for i in range(start, min(stop, self.size)):
+            yield self.candidate(i)
+
+    def fill(self, keyspace, start, count, buf):
+        # batches.key_batches() hook, the numpy fill only knows pwd_gen
+        # order
+        fill_python(self, start, count, buf)
+
+    def leases(self, nodes):
+        return Keyspace.leases(self, nodes)
+
+    def describe(self):
+        model = json.dumps([self.start_level, self.trans_level,
+                            sorted(self.length_level.items())])
+        return {"charset": self.charset.decode("latin-1"),
+                "min_len": self.min_len, "max_len": self.max_len,
+                "markov": hashlib.sha256(model.encode()).hexdigest()}
+
+
+def main():
+    if len(argv) < 3:
+        print("usage: %s train corpus model [charset] [max_len]" % argv[0])
+        print("       %s list model [count] [start]" % argv[0])
+        print("       %s leases model nodes" % argv[0])
+        return
+    if argv[1] == "train":
+        from mangle import wordlist
+        from crack import CHARSET
+        charset = argv[4] if len(argv) > 4 else CHARSET
+        max_len = int(argv[5]) if len(argv) > 5 else 8
+        model = MarkovModel(charset, max_len)
+        print("%d training words" % model.train(wordlist(argv[2])))
+        model.save(argv[3])
+        return
+    keyspace = MarkovKeyspace(MarkovModel.load(argv[2]))
+    if argv[1] == "leases":
+        print("keyspace size\t%d" % keyspace.size)
+        for i, (start, stop) in enumerate(keyspace.leases(int(argv[3]))):
+            print("lease %d\t%d..%d\t%s..%s" %
+                  (i, start, stop-1, keyspace.candidate(start).decode(),
+                   keyspace.candidate(stop-1).decode()))
+    else:
+        count = int(argv[3]) if len(argv) > 3 else 100
+        start = int(argv[4]) if len(argv) > 4 else 0
+        for pwd in keyspace.candidates(start, start + count):
+            print(pwd.decode("latin-1"))
+
+
+if __name__ == "__main__":
+    main()
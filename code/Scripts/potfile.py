@@ -0,0 +1,188 @@
+#!/usr/bin/python3
+# coding: utf-8
+import hashlib
+import os
+import struct
+from sys import argv
+from time import monotonic
+
+POTFILE = "bcrypt.pot"
+SYNC_EVERY = 64
+SYNC_INTERVAL = 5.0
+# index: magic, potfile bytes covered, then the sorted 16 byte digests of
+# the hash strings in the covered part
+INDEX_HEADER = struct.Struct(">4sQ")
+INDEX_MAGIC = b"POT1"
+DIGEST_LEN = 16
+
+
+def digest(hashed):
+    if isinstance(hashed, str):
+        hashed = hashed.encode("ascii")
+    return hashlib.blake2b(hashed, digest_size=DIGEST_LEN).digest()
+
+
+def encode_password(pwd):
+    # hashcat style $HEX[] for passwords that do not survive a text line
+    try:
+        text = pwd.decode("utf-8")
+    except UnicodeDecodeError:
+        text = None
+    if (text is None or "\n" in text or "\r" in text or
+            text.startswith("$HEX[")):
+        return b"$HEX[" + pwd.hex().encode("ascii") + b"]"
+    return pwd
+
+
+def decode_password(field):
+    if field.startswith(b"$HEX[") and field.endswith(b"]"):
+        return bytes.fromhex(field[5:-1].decode("ascii"))
+    return field
+
+
+def parse_line(line):
+    # b"hash:password\n" -> (hash string, password bytes) or None
+    line = line.rstrip(b"\r\n")
+    hashed, sep, pwd = line.partition(b":")
+    if not sep or not hashed.startswith(b"$2"):
+        return None
+    return (hashed.decode("ascii"), decode_password(pwd))
+
+
+class Potfile(object):
+    # Append-only file of cracked hashes, one "hash:password" per line.
+    # The digests of all hashes are kept in a set, loaded from the index
+    # file and the potfile lines it does not cover yet. Appends are
+    # fsynced every `sync_every` entries or `sync_interval` seconds and on
+    # close(), which also rewrites the index.
+
+    def __init__(self, filename=POTFILE, sync_every=SYNC_EVERY,
+                 sync_interval=SYNC_INTERVAL):
+        self.filename = filename
+        self.index_file = filename + ".idx"
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.digests = set()
+        self.pending = 0
+        self.synced = monotonic()
+        self.load()
+        self.f = open(filename, "ab")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.digests)
+
+    def __contains__(self, hashed):
+        return digest(hashed) in self.digests
+
+    def load(self):
+        covered = self.load_index()
+        try:
+            with open(self.filename, "rb") as f:
+                f.seek(covered)
+                for line in f:
+                    entry = parse_line(line)
+                    if entry is not None:
+                        self.digests.add(digest(entry[0]))
+        except FileNotFoundError:
+            pass
+
+    def load_index(self):
+        # potfile bytes covered by the index, 0 if it is missing or stale
+        try:
+            with open(self.index_file, "rb") as f:
+                data = f.read()
+            size = os.path.getsize(self.filename)
+        except FileNotFoundError:
+            return 0
+        if len(data) < INDEX_HEADER.size:
+            return 0
+        magic, covered = INDEX_HEADER.unpack_from(data)
+        body = data[INDEX_HEADER.size:]
+        if magic != INDEX_MAGIC or covered > size or len(body) % DIGEST_LEN:
+            return 0
+        self.digests.update(body[i:i+DIGEST_LEN]
+                            for i in range(0, len(body), DIGEST_LEN))
+        return covered
+
+    def save_index(self):
+        self.f.flush()
+        covered = os.path.getsize(self.filename)
+        tmp = self.index_file + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, covered))
+            f.write(b"".join(sorted(self.digests)))
+        os.replace(tmp, self.index_file)
+
+    def add(self, hashed, pwd):
+        d = digest(hashed)
+        if d in self.digests:
+            return
+        self.digests.add(d)
+        self.f.write(hashed.encode("ascii") + b":" + encode_password(pwd) +
+                     b"\n")
+        self.pending += 1
+        if (self.pending >= self.sync_every or
+                monotonic() - self.synced >= self.sync_interval):
+            self.sync()
+
+    def sync(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.pending = 0
+        self.synced = monotonic()
+
+    def close(self):
+        if self.f is None:
+            return
+        self.sync()
+        self.save_index()
+        self.f.close()
+        self.f = None
+
+    def filter(self, hashes):
+        # the hashes that are not cracked yet
+        return [h for h in hashes if digest(h) not in self.digests]
+
+    def entries(self):
+        # (hash string, password) of every line
+        self.f.flush()
+        with open(self.filename, "rb") as f:
+            for line in f:
+                entry = parse_line(line)
+                if entry is not None:
+                    yield entry
+
+    def get(self, hashed):
+        # the password of hashed, scans the file on a hit
+        if hashed not in self:
+            return None
+        for h, pwd in self.entries():
+            if h == hashed:
+                return pwd
+        return None
+
+
+def main():
+    if len(argv) < 2:
+        print("usage: %s potfile [hashfile]" % argv[0])
+        return
+    with Potfile(argv[1]) as pot:
+        if len(argv) < 3:
+            print("%d cracked hashes" % len(pot))
+            return
+        with open(argv[2]) as f:
+            hashes = [l.strip() for l in f if l.startswith("$2")]
+        left = pot.filter(hashes)
+        for h in left:
+            print(h)
+        print("%d of %d left" % (len(left), len(hashes)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/python3
+# coding: utf-8
+import asyncio
+import json
+from collections import namedtuple
+from sys import argv
+from bcrypt_device import BcryptDevice, target_registers
+from crack import CHARSET
+from keyspace import Keyspace
+from stats import FPGA_FREQUENCY, fpga_cycles
+from targets import TargetIndex
+from potfile import Potfile
+
+# bcrypt cores of one board (10 quad cores) and the password length its
+# pwd_gen runs up to
+BOARD_CORES = 40
+BOARD_MAX_LEN = 8
+# candidates one bcrypt core has to test for the default FPGA keyspace
+# (62^8 passwords on 10 quad cores)
+CORE_CANDIDATES = 62**8 // BOARD_CORES
+TIMEOUT_MARGIN = 1.5
+MAX_ATTEMPTS = 3
+# consecutive OSErrors after which a board is no longer used
+MAX_DEVICE_ERRORS = 3
+
+Job = namedtuple("Job", "id salt hash cost attempts")
+JobResult = namedtuple("JobResult", "job device result error")
+
+
+def expected_runtime(cost, candidates=CORE_CANDIDATES):
+    return candidates * fpga_cycles(cost) / FPGA_FREQUENCY
+
+
+class Scheduler(object):
+    # Keeps a pool of boards busy: every device pulls the next job as soon
+    # as it is free. A job whose board exceeds the expected runtime is put
+    # back into the queue and retried on the next free board. A board
+    # that cannot be opened or fails max_errors times in a row is retired.
+    # keyspace: the pwd_gen keyspace of the boards, split over `cores`.
+    # candidates: the per core count the timeouts are based on, by
+    # default a core's share of the keyspace.
+
+    def __init__(self, paths, candidates=None,
+                 margin=TIMEOUT_MARGIN, max_attempts=MAX_ATTEMPTS,
+                 device=BcryptDevice, max_errors=MAX_DEVICE_ERRORS,
+                 keyspace=None, cores=BOARD_CORES):
+        self.paths = list(paths)
+        if keyspace is None:
+            keyspace = Keyspace(CHARSET, BOARD_MAX_LEN)
+        self.keyspace = keyspace
+        self.cores = cores
+        if candidates is None:
+            candidates = -(-keyspace.size // cores)
+        self.candidates = candidates
+        self.margin = margin
+        self.max_attempts = max_attempts
+        self.max_errors = max_errors
+        self.device = device
+        # boards taken out of service: path -> the error
+        self.dead = {}
+        self.busy = dict.fromkeys(self.paths, 0.0)
+        # one record per finished job, see capacity.telemetry_model()
+        self.telemetry = []
+
+    def timeout(self, cost):
+        return self.margin * expected_runtime(cost, self.candidates)
+
+    def searched(self, result):
+        # candidates one core went through: the keyspace up to the
+        # password on a hit, all of it else. None if the password is not
+        # in the keyspace
+        if result.success:
+            try:
+                tried = self.keyspace.index(result.password) + 1
+            except (ValueError, KeyError):
+                return None
+        else:
+            tried = self.keyspace.size
+        return -(-tried // self.cores)
+
+    async def worker(self, path, jobs, results):
+        loop = asyncio.get_running_loop()
+        try:
+            dev = self.device(path)
+        except Exception as e:
+            self.retire(path, e, jobs, results)
+            return
+        errors = 0
+        with dev:
+            while True:
+                job = await jobs.get()
+                started = loop.time()
+                try:
+                    result = await dev.run(job.salt, job.hash, job.cost,
+                                           self.timeout(job.cost))
+                    self.telemetry.append({
+                        "device": path, "cost": job.cost,
+                        "candidates": self.searched(result),
+                        "seconds": loop.time() - started,
+                        "success": result.success})
+                    results.put_nowait(JobResult(job, path, result, None))
+                    errors = 0
+                except (asyncio.TimeoutError, OSError) as e:
+                    try:
+                        dev.stop()
+                    except OSError:
+                        pass
+                    # TimeoutError is an OSError since Python 3.3
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.retry(job, path, e, jobs, results)
+                    else:
+                        # a fault of the board, the job keeps its attempts
+                        jobs.put_nowait(job)
+                        errors += 1
+                        if errors >= self.max_errors:
+                            self.retire(path, e, jobs, results)
+                            return
+                    # let an idle board pick it up first
+                    await asyncio.sleep(0)
+                except Exception as e:
+                    # a problem of the job, not of the board
+                    results.put_nowait(JobResult(job, path, None, e))
+                finally:
+                    self.busy[path] += loop.time() - started
+
+    def retry(self, job, path, error, jobs, results):
+        job = job._replace(attempts=job.attempts+1)
+        if job.attempts < self.max_attempts:
+            jobs.put_nowait(job)
+        else:
+            results.put_nowait(JobResult(job, path, None, error))
+
+    def retire(self, path, error, jobs, results):
+        # stop using a board that cannot be opened or keeps failing. Once
+        # the last board is gone the queued jobs fail instead of waiting
+        self.dead[path] = error
+        if len(self.dead) < len(self.paths):
+            return
+        while not jobs.empty():
+            results.put_nowait(JobResult(jobs.get_nowait(), None, None,
+                                         error))
+
+    async def run(self, targets):
+        # targets: (salt, hash, cost) in register byte order or $2a$
+        # strings. Yields a JobResult as soon as a job is finished
+        jobs = asyncio.Queue()
+        results = asyncio.Queue()
+        self.dead = {}
+        n = 0
+        for t in targets:
+            if isinstance(t, str):
+                t = target_registers(t)
+            jobs.put_nowait(Job(n, t[0], t[1], t[2], 0))
+            n += 1
+        if not self.paths:
+            raise ValueError("no devices to schedule on")
+        workers = [asyncio.ensure_future(self.worker(p, jobs, results))
+                   for p in self.paths]
+        try:
+            for i in range(n):
+                yield await results.get()
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def save_telemetry(self, filename):
+        with open(filename, "a") as f:
+            for record in self.telemetry:
+                f.write(json.dumps(record, sort_keys=True) + "\n")
+
+    def utilization(self, elapsed):
+        return dict((p, t / elapsed if elapsed else 0.0)
+                    for p, t in self.busy.items())
+
+
+async def schedule(paths, hashes, telemetry=None, potfile=None,
+                   max_len=BOARD_MAX_LEN, margin=TIMEOUT_MARGIN):
+    # max_len: the boards' pwd_gen keyspace, the timeouts and the
+    # telemetry records are based on it. margin: timeout over the
+    # expected runtime, see emulator.py for a software board
+    sched = Scheduler(paths, margin=margin,
+                      keyspace=Keyspace(CHARSET, max_len))
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    async for r in sched.run(hashes):
+        if r.error is not None:
+            print("%d: failed on %s: %s" % (r.job.id, r.device, r.error))
+        elif r.result.success:
+            print("%d: Found Password: %s" %
+                  (r.job.id, r.result.password.decode("utf-8", "replace")))
+            if potfile is not None:
+                potfile.add(hashes[r.job.id], r.result.password)
+        else:
+            print("%d: not found" % r.job.id)
+    elapsed = loop.time() - started
+    for path, u in sorted(sched.utilization(elapsed).items()):
+        print("%s: %.1f %% busy" % (path, 100*u))
+    if telemetry:
+        sched.save_telemetry(telemetry)
+
+
+def main():
+    args = argv[1:]
+    telemetry = None
+    max_len = BOARD_MAX_LEN
+    margin = TIMEOUT_MARGIN
+    while (args[:1] in (["--telemetry"], ["--max-len"], ["--margin"]) and
+           len(args) > 1):
+        if args[0] == "--telemetry":
+            telemetry = args[1]
+        elif args[0] == "--max-len":
+            max_len = int(args[1])
+        else:
+            margin = float(args[1])
+        args = args[2:]
+    if len(args) < 2:
+        print("usage: %s [--telemetry file] [--max-len n] "
+              "[--margin factor] hashfile device [device ...]" % argv[0])
+        print("n: password length the boards search up to, default %d" %
+              BOARD_MAX_LEN)
+        print("factor: timeout over the expected runtime, default %g" %
+              TIMEOUT_MARGIN)
+        return
+    with open(args[0]) as f:
+        hashes = [l.strip() for l in f if l.startswith("$2")]
+    # a board checks one hash per job, but group order runs the cheap
+    # costs first and keeps targets of one salt together
+    with Potfile() as pot:
+        left = TargetIndex(pot.filter(hashes)).ordered_hashes()
+        print("%d of %d already in %s" % (len(hashes) - len(left),
+                                         len(hashes), pot.filename))
+        asyncio.run(schedule(args[1:], left, telemetry, pot, max_len,
+                             margin))
+
+
+if __name__ == "__main__":
+    main()
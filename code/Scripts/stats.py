@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+# coding: utf-8
+import json
+from time import perf_counter
+
+# FPGA cycle model of one bcrypt core, cycles(cost) = BASE + 2^(cost+1)*EXP
+# (see paper/latex-code-gen.py). EXP cycles are one expandKey of the cost
+# loop; BASE covers initState, expandKey(salt, key) and the 64x3 final
+# encryptions, the hardware does not expose a finer split.
+FPGA_FREQUENCY = 100*10**6
+FPGA_BASE_CYCLES = 12939
+FPGA_EXPAND_CYCLES = 9397
+
+PHASES = ("init", "setup", "cost", "encrypt")
+
+# encrypt() calls of one expandKey: 9 P blocks + 4*128 sbox blocks
+EXPAND_ENCRYPTS = 9 + 512
+
+
+def fpga_cycles(cost):
+    return FPGA_BASE_CYCLES + 2**(cost+1)*FPGA_EXPAND_CYCLES
+
+
+class BcryptStats(object):
+    # Opt-in phase timing for bcrypt(), pass an instance as stats=. The
+    # engines only call start()/mark()/done() once per phase, nothing is
+    # recorded inside encrypt().
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.time = dict.fromkeys(PHASES, 0.0)
+        self.encrypts = dict.fromkeys(PHASES, 0)
+        self.costs = {}
+        self.hashes = 0
+        self._t = 0.0
+
+    def start(self):
+        self._t = perf_counter()
+
+    def mark(self, phase, encrypts=0):
+        t = perf_counter()
+        self.time[phase] += t - self._t
+        self.encrypts[phase] += encrypts
+        self._t = t
+
+    def done(self, cost):
+        self.hashes += 1
+        self.costs[cost] = self.costs.get(cost, 0) + 1
+
+    def merge(self, other):
+        # aggregate the stats of another worker into this one
+        for phase in PHASES:
+            self.time[phase] += other.time[phase]
+            self.encrypts[phase] += other.encrypts[phase]
+        for cost, n in other.costs.items():
+            self.costs[cost] = self.costs.get(cost, 0) + n
+        self.hashes += other.hashes
+        return self
+
+    def total_time(self):
+        return sum(self.time.values())
+
+    def hashes_per_second(self):
+        total = self.total_time()
+        return self.hashes / total if total else 0.0
+
+    def fpga_time(self, frequency=FPGA_FREQUENCY):
+        # time a single bcrypt core needs for the same hashes, split into
+        # the cost loop and the constant part of the cycle model
+        loop = sum(n * 2**(cost+1)*FPGA_EXPAND_CYCLES
+                   for cost, n in self.costs.items())
+        return {"cost": loop / frequency,
+                "init+setup+encrypt": self.hashes*FPGA_BASE_CYCLES/frequency}
+
+    def as_dict(self, frequency=FPGA_FREQUENCY):
+        return {"hashes": self.hashes,
+                "costs": dict((str(c), n) for c, n in self.costs.items()),
+                "time": dict(self.time),
+                "encrypts": dict(self.encrypts),
+                "total_time": self.total_time(),
+                "hashes/s": self.hashes_per_second(),
+                "fpga_time": self.fpga_time(frequency),
+                "software": {"cost": self.time["cost"],
+                             "init+setup+encrypt": (self.time["init"] +
+                                                    self.time["setup"] +
+                                                    self.time["encrypt"])}}
+
+    def to_json(self, filename):
+        with open(filename, "w") as f:
+            json.dump(self.as_dict(), f, indent=1, sort_keys=True)
+
+    def report(self):
+        total = self.total_time() or 1.0
+        lines = ["%d hashes in %.3f s, %.3f hashes/s" %
+                 (self.hashes, self.total_time(), self.hashes_per_second())]
+        for phase in PHASES:
+            lines.append("  %-8s %10.4f s %5.1f %% %12d encrypts" %
+                         (phase, self.time[phase],
+                          100*self.time[phase]/total, self.encrypts[phase]))
+        fpga = self.fpga_time()
+        lines.append("  fpga core: cost loop %.6f s, rest %.6f s" %
+                     (fpga["cost"], fpga["init+setup+encrypt"]))
+        return "\n".join(lines)
@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+# coding: utf-8
+from collections import Counter
+from sys import argv
+from helper import *
+from hashdump import load_dump
+
+
+class TargetGroup(object):
+    # All targets sharing cost and salt: one EksBlowfish setup per
+    # candidate serves every one of them. digests maps the first ctext
+    # block (as int) to {remaining 15 hash bytes: [hash strings]}, see
+    # Hasher.matchDigests()
+
+    def __init__(self, cost, salt):
+        self.cost = cost
+        self.salt = salt
+        self.digests = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, hash_, hashed):
+        # hash_: the 23 raw hash bytes of hashed. A hash string given
+        # twice is kept once, len() counts distinct targets
+        first = bytestring2int(hash_[:8])
+        hs = self.digests.setdefault(first, {}).setdefault(
+            bytes(hash_[8:23]), [])
+        if hashed in hs:
+            return
+        hs.append(hashed)
+        self.count += 1
+
+    def hashes(self):
+        return [h for tails in self.digests.values()
+                for hs in tails.values() for h in hs]
+
+
+class TargetIndex(object):
+    # Targets grouped by (cost, salt)
+
+    def __init__(self, hashes=()):
+        self.groups = {}
+        for hashed in hashes:
+            self.add(hashed)
+
+    def __len__(self):
+        return sum(len(g) for g in self.groups.values())
+
+    def group(self, cost, salt):
+        key = (cost, bytes(salt))
+        if key not in self.groups:
+            self.groups[key] = TargetGroup(cost, bytes(salt))
+        return self.groups[key]
+
+    def add(self, hashed):
+        cost, salt, hash_ = parse_hash(hashed)
+        self.group(cost, salt).add(hash_, hashed)
+
+    def add_dump(self, dump):
+        # a hashdump.HashDump, its hashes are kept as strings
+        for i in range(len(dump)):
+            cost, salt, hash_ = dump.target(i)
+            self.group(cost, salt).add(hash_, dump.hashed(i))
+
+    def ordered(self):
+        # cheapest cost first, within a cost the groups that crack the
+        # most targets per setup first
+        return sorted(self.groups.values(),
+                      key=lambda g: (g.cost, -len(g), g.salt))
+
+    def ordered_hashes(self):
+        # every target in group order, e.g. for the FPGA job queue
+        return [h for g in self.ordered() for h in g.hashes()]
+
+
+def load_targets(filename):
+    index = TargetIndex()
+    index.add_dump(load_dump(filename))
+    return index
+
+
+def main():
+    if len(argv) < 2:
+        print("usage: %s dumpfile" % argv[0])
+        return
+    index = load_targets(argv[1])
+    groups = index.ordered()
+    print("hashes\t%d" % len(index))
+    print("groups\t%d" % len(groups))
+    for size, n in sorted(Counter(len(g) for g in groups).items()):
+        print("%d per salt\t%d" % (size, n))
+
+
+if __name__ == "__main__":
+    main()
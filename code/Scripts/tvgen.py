@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+# coding: utf-8
+import os
+import multiprocessing as mp
+from argparse import ArgumentParser
+from itertools import product
+from bcrypt_test import bcrypt
+
+TV_FILES = ("tv_conf.txt", "tv_init.txt", "tv_exp.txt", "tv_cost.txt",
+            "tv_enc.txt")
+
+
+def vector_dir(out, salt, key, cost):
+    return os.path.join(out, "cost%0.2d_key%s_salt%s" %
+                        (cost, key.hex(), salt.hex()))
+
+
+def gen_vector(args):
+    # one tv_* set, key without the terminating NUL
+    salt, key, cost, directory, engine = args
+    os.makedirs(directory, exist_ok=True)
+    result = bcrypt(salt, key + b"\x00", cost, generate_tv_files=True,
+                    engine=engine, tv_dir=directory)
+    return (directory, result)
+
+
+def data_lines(filename):
+    # the hex lines of a tv file, without the "--" header
+    with open(filename) as f:
+        return [l.rstrip("\n") for l in f if not l.startswith("--")]
+
+
+def write_packed(filename, vectors):
+    # all vectors in one file: conf (salt, key), 256 lines each of init,
+    # exp and cost state, then the encryption result
+    out = ["-- Format:",
+           "-- %d vectors of: salt, key, 3x256 192 Bit state lines"
+           " (init, exp, cost), 192 Bit result" % len(vectors)]
+    for directory, result in vectors:
+        out.append("-- %s %s" % (os.path.basename(directory), result))
+        for name in TV_FILES:
+            out += data_lines(os.path.join(directory, name))
+    with open(filename, "w") as f:
+        f.write("\n".join(out) + "\n")
+
+
+def generate(salts, keys, costs, out="tv", jobs=None, engine="unrolled",
+             packed=None):
+    # test vectors for the full grid salts x keys x costs
+    tasks = [(salt, key, cost, vector_dir(out, salt, key, cost), engine)
+             for salt, key, cost in product(salts, keys, costs)]
+    # largest costs first so the pool does not wait on a straggler
+    tasks.sort(key=lambda t: -t[2])
+    with mp.Pool(jobs) as pool:
+        vectors = pool.map(gen_vector, tasks, chunksize=1)
+    vectors.sort()
+    if packed is not None:
+        write_packed(packed, vectors)
+    return vectors
+
+
+def main():
+    parser = ArgumentParser(description="bulk test vectors for bcrypt_tb")
+    parser.add_argument("--keys", nargs="+", default=["b"])
+    parser.add_argument("--costs", nargs="+", type=int, default=[0])
+    parser.add_argument("--salts", nargs="+", default=[],
+                        help="salts as 32 hex digits")
+    parser.add_argument("--random-salts", type=int, default=0)
+    parser.add_argument("--out", default="tv")
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--engine", default="unrolled")
+    parser.add_argument("--packed", default=None,
+                        help="also write all vectors into this file")
+    args = parser.parse_args()
+
+    salts = [bytes.fromhex(s) for s in args.salts]
+    salts += [os.urandom(16) for i in range(args.random_salts)]
+    if not salts:
+        salts = [b"\xce\x33\x5f\xbf\x78\x49\x59\xc7"
+                 b"\x81\x33\x2a\x5d\x8d\xcd\x25\x35"]
+    keys = [bytes(k, "utf-8") for k in args.keys]
+    for directory, result in generate(salts, keys, args.costs, args.out,
+                                      args.jobs, args.engine, args.packed):
+        print("%s %s" % (directory, result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+# coding: utf-8
+import asyncio
+import hmac
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from sys import argv
+from helper import *
+from hashdump import valid_line
+from kernel import get_hasher
+
+ENGINE = "unrolled"
+# pairs per task of verify_many(), low costs are too cheap for one each
+CHUNK_SIZE = 4
+# bcrypt accepts costs up to 31, but every step doubles the time: past
+# MAX_COST a submitted hash would tie up a worker for good
+MIN_COST = 4
+MAX_COST = 16
+
+# Hashers are not reentrant, every thread of the calling process and every
+# pool worker gets its own
+_local = threading.local()
+_pool = None
+
+
+def _key(password):
+    # str or bytes password -> NUL terminated key as bcrypt() expects it
+    if isinstance(password, str):
+        password = password.encode("utf-8")
+    return bytes(password) + b"\x00"
+
+
+def _target(hashed, max_cost=MAX_COST):
+    if isinstance(hashed, str):
+        hashed = hashed.encode("ascii", "replace")
+    if not valid_line(hashed):
+        raise ValueError("invalid bcrypt hash %r" % hashed)
+    cost, salt, hash_ = parse_hash(hashed.decode("ascii"))
+    if not MIN_COST <= cost <= max_cost:
+        raise ValueError("bcrypt cost %d outside of %d..%d" %
+                         (cost, MIN_COST, max_cost))
+    return (cost, salt, hash_)
+
+
+def _get_hasher(engine=ENGINE):
+    hasher = getattr(_local, "hasher", None)
+    if hasher is None:
+        hasher = _local.hasher = get_hasher(engine)
+    return hasher
+
+
+def _init_worker(engine):
+    _get_hasher(engine)
+
+
+def _verify(pair, max_cost=MAX_COST):
+    password, hashed = pair
+    cost, salt, hash_ = _target(hashed, max_cost)
+    hasher = _get_hasher()
+    # all three blocks are computed, matchCtext() returns early on a
+    # mismatch and would leak that through the timing
+    hasher.eksSetup(salt, cycleKey(_key(password)), cost)
+    ctext2, ctext1, ctext0 = hasher.encryptCtext()
+    ctext = int2bytestring((ctext2 << 128) | (ctext1 << 64) | ctext0, 24)
+    return hmac.compare_digest(ctext[:23], hash_)
+
+
+def _check(pair, max_cost=MAX_COST):
+    # _verify() for the batch calls: a malformed hash or a cost out of
+    # range fails its own pair instead of the whole batch
+    try:
+        return _verify(pair, max_cost)
+    except ValueError:
+        return False
+
+
+def checkpw(password, hashed, max_cost=MAX_COST):
+    # True if password hashes to the $2a$/$2b$/$2y$ string hashed, raises
+    # ValueError for a malformed hash or a cost above max_cost
+    return _verify((password, hashed), max_cost)
+
+
+def get_pool(workers=None, engine=ENGINE):
+    # the process pool shared by verify_many() and the asyncio wrappers,
+    # started on first use and kept until shutdown()
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                    initializer=_init_worker,
+                                    initargs=(engine,))
+    return _pool
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def verify_many(pairs, chunksize=CHUNK_SIZE, max_cost=MAX_COST):
+    # [checkpw(password, hashed) for password, hashed in pairs] on the
+    # process pool, results in the order of pairs. A pair checkpw() would
+    # raise ValueError for is False
+    return list(get_pool().map(partial(_check, max_cost=max_cost), pairs,
+                               chunksize=chunksize))
+
+
+async def acheckpw(password, hashed, max_cost=MAX_COST):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pool(), _verify,
+                                      (password, hashed), max_cost)
+
+
+async def averify_many(pairs, max_cost=MAX_COST):
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+    return await asyncio.gather(*[loop.run_in_executor(pool, _check, pair,
+                                                       max_cost)
+                                  for pair in pairs])
+
+
+def main():
+    if len(argv) < 2:
+        print("usage: %s hashfile" % argv[0])
+        print("hashfile: one 'password hash' pair per line")
+        return
+    with open(argv[1]) as f:
+        pairs = [tuple(l.rstrip("\n").rsplit(" ", 1)) for l in f
+                 if " $2" in l]
+    try:
+        for (password, hashed), ok in zip(pairs, verify_many(pairs)):
+            print("%s %s" % ("OK  " if ok else "FAIL", hashed))
+    finally:
+        shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -128,6 +128,9 @@ architecture behavioral of bcrypt_quad_core is
 
 	-- target hash, split into 64 bits, multiplex via result hash counter
 	signal hashDword : std_logic_vector(63 downto 0);
+	-- compared bits of hashDword: a $2a$ hash string carries 23 of the 24
+	-- ctext bytes, the last one (t_hash(7 downto 0)) is never compared
+	signal hashMask  : std_logic_vector(63 downto 0);
 	-- hash output counter
 	signal hashcnt    : std_logic_vector(1 downto 0);
 	signal hashcnt_ce : std_logic;
@@ -223,6 +226,8 @@ begin
 	hashDword <= t_hash(127 downto  64) when hashcnt(0) = '1' else  -- 01
 				 t_hash( 63 downto   0) when hashcnt(1) = '1' else  -- 10
 				 t_hash(191 downto 128);                            -- 00
+	hashMask  <= x"ffffffffffffff00" when hashcnt(1) = '1' else
+				 (others => '1');
 
     -- --------------------------------------------------------------------- --
     -- Instantiation    bcrypt cores
@@ -276,7 +281,7 @@ begin
 				D      => bcrypt_core_success_in(i),
 				Q      => bcrypt_core_success(i)
 			);
-        bcrypt_core_success_in(i) <= bcrypt_core_success(i) when bcrypt_core_dout_d(i) = hashDword else '0';
+        bcrypt_core_success_in(i) <= bcrypt_core_success(i) when (bcrypt_core_dout_d(i) and hashMask) = (hashDword and hashMask) else '0';
     end generate bcrypt_gen;
 
 	-- core specific control signals